@@ -0,0 +1,175 @@
+"""Benchmark downloading inputs from a local stand-in server.
+
+Runs `InputInfo.download_if_necessary()` over the given scenarios and download concurrencies,
+and prints the results (wall time, throughput and the download stats totals) as JSON lines:
+
+    python -m benchmarks.download --scenario many-small --concurrency 4 --concurrency 16 --latency 0.02
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from benchmarks.server import ServerConfig, StandInServer
+from valohai.internals.download_stats import (
+    clear_download_records,
+    get_download_records,
+    summarize,
+)
+from valohai.internals.download_type import DownloadType
+from valohai.internals.input_info import FileInfo, InputInfo
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    file_count: int
+    file_size: int
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("many-small", file_count=1000, file_size=16 * 1024),
+        Scenario("few-huge", file_count=4, file_size=256 * 1024 * 1024),
+    )
+}
+
+
+def run_scenario(
+    server: StandInServer,
+    scenario: Scenario,
+    concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Download the files of `scenario` from `server` into a temporary directory, and time it."""
+    input_info = InputInfo(
+        FileInfo(
+            name=f"file-{i:05d}.bin",
+            uri=server.url_for(f"file-{i:05d}.bin", scenario.file_size),
+            size=scenario.file_size,
+        )
+        for i in range(scenario.file_count)
+    )
+    clear_download_records()
+    with tempfile.TemporaryDirectory() as inputs_dir, _environ(
+        VH_INPUTS_DIR=inputs_dir,
+        VH_DOWNLOAD_CONCURRENCY=str(concurrency) if concurrency else None,
+        VH_INPUT_CACHE_DIR=None,
+        VH_LOG_DOWNLOAD_STATS=None,
+    ):
+        started_at = time.monotonic()
+        # Keep the download messages out of the results
+        with contextlib.redirect_stdout(sys.stderr):
+            input_info.download_if_necessary(scenario.name, DownloadType.ALWAYS)
+        wall_time = time.monotonic() - started_at
+    total_bytes = scenario.file_count * scenario.file_size
+    return {
+        "scenario": scenario.name,
+        "file_count": scenario.file_count,
+        "file_size": scenario.file_size,
+        "concurrency": concurrency,
+        "server": asdict(server.config),
+        "wall_time": round(wall_time, 3),
+        "throughput": round(total_bytes / wall_time) if wall_time else None,
+        "requests": server.request_count,
+        "injected_failures": server.failure_count,
+        **summarize(get_download_records()),
+    }
+
+
+@contextlib.contextmanager
+def _environ(**values: Optional[str]) -> Iterator[None]:
+    """Set (or with None, unset) environment variables for the duration of the block."""
+    old_values = {key: os.environ.get(key) for key in values}
+    try:
+        for key, value in values.items():
+            _set_env(key, value)
+        yield
+    finally:
+        for key, value in old_values.items():
+            _set_env(key, value)
+
+
+def _set_env(key: str, value: Optional[str]) -> None:
+    if value is None:
+        os.environ.pop(key, None)
+    else:
+        os.environ[key] = value
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run (repeatable; default: all)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        action="append",
+        type=int,
+        help="download concurrency to run with (repeatable; default: the library default)",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="multiply the file sizes of the scenarios by this",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds before each response"
+    )
+    parser.add_argument("--bandwidth", type=int, help="bytes per second per response")
+    parser.add_argument(
+        "--no-range", action="store_true", help="don't support range requests"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="share of requests that fail with a 503",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="file to write the results into (default: stdout)"
+    )
+    args = parser.parse_args(argv)
+
+    config = ServerConfig(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        range_support=not args.no_range,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    scenarios = [
+        Scenario(
+            scenario.name,
+            file_count=scenario.file_count,
+            file_size=max(1, int(scenario.file_size * args.scale)),
+        )
+        for scenario in (SCENARIOS[name] for name in args.scenario or SCENARIOS)
+    ]
+    with contextlib.ExitStack() as stack:
+        output = (
+            stack.enter_context(open(args.output, "w")) if args.output else sys.stdout
+        )
+        for scenario in scenarios:
+            for concurrency in args.concurrency or [None]:
+                for _ in range(args.repeat):
+                    # A fresh server for each run, so the request counts are per run
+                    with StandInServer(config) as server:
+                        result = run_scenario(server, scenario, concurrency)
+                    print(json.dumps(result), file=output, flush=True)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
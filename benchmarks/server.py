@@ -0,0 +1,172 @@
+"""A local stand-in for the storage services inputs are downloaded from.
+
+Serves generated files of any size at `/files/<size>/<name>`, with configurable latency,
+bandwidth, range request support and failure injection, so downloads can be benchmarked
+without a network and with reproducible conditions.
+"""
+
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+# The content of every file is this pattern repeated; see `get_content()`
+PATTERN = bytes(range(256)) * (CHUNK_SIZE // 256)
+
+FILE_PATH_RE = re.compile(r"^/files/(?P<size>\d+)/(?P<name>[^/?]+)")
+RANGE_RE = re.compile(r"^bytes=(?P<start>\d+)-(?P<end>\d*)$")
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    latency: float = 0.0  # seconds before each response
+    bandwidth: Optional[int] = None  # bytes per second per response; None for unlimited
+    range_support: bool = True
+    failure_rate: float = 0.0  # share of requests that fail with a 503
+    seed: int = 0  # for choosing the requests that fail
+
+
+def get_content(size: int, start: int = 0, end: Optional[int] = None) -> bytes:
+    """Get the content (or a part of it) of a file served by the stand-in server."""
+    end = size if end is None else end
+    offset = start % len(PATTERN)
+    repeats = (offset + end - start) // len(PATTERN) + 1
+    return (PATTERN * repeats)[offset : offset + end - start]
+
+
+class StandInServer:
+    """A threaded HTTP server serving generated files, on a random local port.
+
+    Use as a context manager, or call `start()` and `stop()`.
+    """
+
+    def __init__(self, config: Optional[ServerConfig] = None) -> None:
+        self.config = config or ServerConfig()
+        self.request_count = 0
+        self.failure_count = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def url_for(self, name: str, size: int) -> str:
+        return f"{self.url}/files/{size}/{name}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.request_count += 1
+            if self._random.random() < self.config.failure_rate:
+                self.failure_count += 1
+                return True
+        return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # for keep-alive connections
+
+    @property
+    def stand_in(self) -> StandInServer:
+        return self.server.stand_in  # type: ignore[attr-defined,no-any-return]
+
+    def do_HEAD(self) -> None:
+        self._respond(send_body=False)
+
+    def do_GET(self) -> None:
+        self._respond(send_body=True)
+
+    def _respond(self, send_body: bool) -> None:
+        config = self.stand_in.config
+        if config.latency:
+            time.sleep(config.latency)
+        match = FILE_PATH_RE.match(self.path)
+        if not match:
+            self._send_empty(404)
+            return
+        if self.stand_in.should_fail():
+            self._send_empty(503)
+            return
+        size = int(match.group("size"))
+        byte_range = self._get_range(size) if config.range_support else None
+        if byte_range == (-1, -1):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = byte_range or (0, size)
+        if byte_range:
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        else:
+            self.send_response(200)
+        if config.range_support:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("ETag", f'"{size}"')
+        self.end_headers()
+        if send_body:
+            self._send_body(size, start, end)
+
+    def _get_range(self, size: int) -> Optional[Tuple[int, int]]:
+        """Get the requested [start, end) range, None for all of it, or (-1, -1) if unsatisfiable."""
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if not match:
+            return None
+        start = int(match.group("start"))
+        end = min(int(match.group("end")) + 1 if match.group("end") else size, size)
+        if start >= end:
+            return (-1, -1)
+        return (start, end)
+
+    def _send_body(self, size: int, start: int, end: int) -> None:
+        bandwidth = self.stand_in.config.bandwidth
+        began = time.monotonic()
+        sent = 0
+        try:
+            for offset in range(start, end, CHUNK_SIZE):
+                chunk = get_content(size, offset, min(offset + CHUNK_SIZE, end))
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if bandwidth:
+                    delay = began + sent / bandwidth - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_empty(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # don't clutter the benchmark output
@@ -68,3 +68,8 @@ def create_files(path):
             f.write(os.urandom(1000))
 
     return outputs
+
+
+@pytest.fixture(autouse=True)
+def isolate_datum_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("VH_DATUM_CACHE_PATH", str(tmpdir.join("datum-cache.json")))
@@ -0,0 +1,58 @@
+import json
+
+import requests
+
+from benchmarks.download import Scenario, main, run_scenario
+from benchmarks.server import ServerConfig, StandInServer, get_content
+
+
+def test_stand_in_server_serves_ranges():
+    with StandInServer() as server:
+        url = server.url_for("file.bin", 100_000)
+        resp = requests.get(url)
+        assert resp.status_code == 200
+        assert resp.content == get_content(100_000)
+        assert resp.content[70_000:70_010] == get_content(100_000, 70_000, 70_010)
+
+        resp = requests.get(url, headers={"Range": "bytes=70000-70009"})
+        assert resp.status_code == 206
+        assert resp.headers["Content-Range"] == "bytes 70000-70009/100000"
+        assert resp.content == get_content(100_000, 70_000, 70_010)
+
+    with StandInServer(ServerConfig(range_support=False)) as server:
+        resp = requests.get(
+            server.url_for("file.bin", 1000), headers={"Range": "bytes=10-19"}
+        )
+        assert resp.status_code == 200
+        assert len(resp.content) == 1000
+
+
+def test_stand_in_server_injects_failures():
+    with StandInServer(ServerConfig(failure_rate=1.0)) as server:
+        assert requests.get(server.url_for("file.bin", 10)).status_code == 503
+        assert server.failure_count == 1
+
+
+def test_run_scenario():
+    with StandInServer(ServerConfig(latency=0.01)) as server:
+        result = run_scenario(server, Scenario("test", 10, 1000), concurrency=5)
+    assert result["download_files"] == 10
+    assert result["download_bytes"] == 10_000
+    assert result["requests"] == 10
+    assert result["wall_time"] > 0.01
+
+
+def test_main_writes_json_lines(tmpdir):
+    output = tmpdir.join("results.jsonl")
+    main(
+        [
+            "--scenario=few-huge",
+            "--scale=0.0001",
+            "--concurrency=1",
+            "--concurrency=4",
+            f"--output={output}",
+        ]
+    )
+    results = [json.loads(line) for line in output.readlines()]
+    assert [r["concurrency"] for r in results] == [1, 4]
+    assert all(r["download_files"] == 4 for r in results)
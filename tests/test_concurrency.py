@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from valohai.internals import global_state
+from valohai.internals.concurrency import get_download_concurrency, map_concurrently
+
+
+def test_map_concurrently_keeps_order():
+    assert map_concurrently(lambda x: x * 2, range(20), max_workers=4) == [
+        x * 2 for x in range(20)
+    ]
+
+
+def test_map_concurrently_is_bounded():
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def work(_):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+
+    map_concurrently(work, range(20), max_workers=3)
+    assert 1 < max_running <= 3
+
+
+def test_map_concurrently_reports_first_error_in_order():
+    def work(x):
+        if x == 1:
+            time.sleep(0.05)
+            raise ValueError("one")
+        if x == 2:
+            raise KeyError("two")
+        return x
+
+    with pytest.raises(ValueError, match="one"):
+        map_concurrently(work, range(3), max_workers=3)
+
+
+def test_download_concurrency_configuration(monkeypatch):
+    global_state.flush_global_state()
+    monkeypatch.setenv("VH_DOWNLOAD_CONCURRENCY", "3")
+    assert get_download_concurrency() == 3
+    global_state.download_concurrency = 5
+    assert get_download_concurrency() == 5
+    global_state.flush_global_state()
+    monkeypatch.setenv("VH_DOWNLOAD_CONCURRENCY", "not-a-number")
+    assert get_download_concurrency() == 8
@@ -0,0 +1,47 @@
+import time
+
+from valohai.internals import datum_cache
+
+DATUM = {
+    "id": "01941935-832f-16d4-af69-6a9bf6bf4df6",
+    "name": "model.pkl",
+    "sha256": "88d4266fd4e6338d13b845fcf289579d209c897823b9217da3e161936f031589",
+    "size": 4,
+}
+
+
+def test_datums_are_cached_by_id_and_alias():
+    assert datum_cache.get_datum(DATUM["id"]) is None
+    datum_cache.store_datum("my-alias", DATUM)
+    assert datum_cache.get_datum(DATUM["id"]) == DATUM
+    assert datum_cache.get_datum("my-alias") == DATUM
+
+
+def test_cache_persists_in_file(tmpdir, monkeypatch):
+    datum_cache.store_datum(DATUM["id"], DATUM)
+    # Another process, i.e. nothing loaded in memory
+    monkeypatch.setattr(datum_cache, "_data", None)
+    assert datum_cache.get_datum(DATUM["id"]) == DATUM
+
+
+def test_alias_resolutions_expire(monkeypatch):
+    monkeypatch.setenv("VH_DATUM_ALIAS_TTL", "60")
+    datum_cache.store_datum("my-alias", DATUM)
+    assert datum_cache.get_datum("my-alias") == DATUM
+    monkeypatch.setattr(time, "time", lambda: 1e12)
+    assert datum_cache.get_datum("my-alias") is None
+    # Datums themselves are immutable, so they don't expire
+    assert datum_cache.get_datum(DATUM["id"]) == DATUM
+
+
+def test_verified_copy(tmpdir):
+    path = tmpdir.join("model.pkl")
+    path.write("abcd")
+    assert not datum_cache.is_verified_copy(DATUM, str(path))
+    datum_cache.mark_verified_copy(DATUM, str(path))
+    assert datum_cache.is_verified_copy(DATUM, str(path))
+    assert not datum_cache.is_verified_copy(dict(DATUM, id="another"), str(path))
+
+    # Modifying the file invalidates it
+    path.write("abcde")
+    assert not datum_cache.is_verified_copy(DATUM, str(path))
@@ -0,0 +1,38 @@
+import os
+
+from valohai.internals.directory_scan import DirectoryScan
+from valohai.internals.input_info import FileInfo, InputInfo
+
+
+def test_directory_scan(tmpdir):
+    tmpdir.join("a.txt").write("abc")
+    tmpdir.mkdir("sub").join("b.txt").write("b")
+    scan = DirectoryScan()
+    assert scan.get_entry(str(tmpdir.join("a.txt"))).stat().st_size == 3
+    assert scan.get_entry(str(tmpdir.join("sub", "b.txt"))).is_file()
+    assert scan.get_entry(str(tmpdir.join("sub"))).is_dir()
+    assert scan.get_entry(str(tmpdir.join("missing.txt"))) is None
+    assert scan.get_entry(str(tmpdir.join("missing", "c.txt"))) is None
+
+    # It's a snapshot
+    tmpdir.join("c.txt").write("c")
+    assert scan.get_entry(str(tmpdir.join("c.txt"))) is None
+
+
+def test_input_is_checked_with_one_scan(tmpdir, monkeypatch):
+    for i in range(0, 100, 2):
+        tmpdir.join(f"{i}.txt").write("x")
+    ii = InputInfo(
+        FileInfo(name=f"{i}.txt", path=str(tmpdir.join(f"{i}.txt"))) for i in range(100)
+    )
+    scandirs = []
+    monkeypatch.setattr(
+        os,
+        "scandir",
+        lambda path, scandir=os.scandir: scandirs.append(path) or scandir(path),
+    )
+    monkeypatch.setattr(os, "stat", None)  # not to be called at all
+
+    assert not ii.is_downloaded()
+    assert not ii.needs_download(files=ii.files[::2])
+    assert scandirs == [str(tmpdir)] * 2
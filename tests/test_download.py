@@ -1,12 +1,17 @@
+import io
 import os
 import sys
 import uuid
 import json
+from pathlib import Path
 
 import pytest
+import requests
 
 import valohai
 from valohai.internals.inputs import get_input_info, get_input_vfs
+from valohai.internals.download_locks import get_state_path
+from valohai.internals.input_info import InputInfo
 from valohai_cli import settings as settings_module
 
 
@@ -237,3 +242,731 @@ def test_download_by_input_id(vte, use_test_config_dir, requests_mock):
     with open(local_filename, "r") as local_file:
         file_contents = local_file.read()
     assert file_contents == "I was downloaded by valohai-utils"
+
+
+def test_download_urls_are_requested_in_one_batch(
+    vte, use_test_config_dir, requests_mock, monkeypatch
+):
+    input_request_url = "http://example.com/input-request/"
+    input_ids = {name: str(uuid.uuid4()) for name in ("first", "second")}
+    inputs_config = {
+        name: {
+            "input_id": input_id,
+            "files": [
+                {
+                    "path": f"{vte.inputs_path}/{name}/{name}.txt",
+                    "name": f"{name}.txt",
+                    "uri": f"s3://bucket/{name}.txt",
+                    "input_id": input_id,
+                }
+            ],
+        }
+        for name, input_id in input_ids.items()
+    }
+    with open(os.path.join(vte.config_path, "inputs.json"), "w") as inputs_f:
+        json.dump(inputs_config, inputs_f)
+    with open(os.path.join(vte.config_path, "api.json"), "w") as api_f:
+        json.dump(
+            {"input_request": {"url": input_request_url, "method": "POST"}}, api_f
+        )
+    requests_mock.post(
+        input_request_url,
+        json=[
+            {
+                "name": name,
+                "files": [
+                    {
+                        "input_id": input_id,
+                        "url": f"https://example.com/{name}.txt?X-Amz-Date=20990101T000000Z&X-Amz-Expires=3600",
+                        "filename": f"{name}.txt",
+                    }
+                ],
+            }
+            for name, input_id in input_ids.items()
+        ],
+    )
+    for name in input_ids:
+        requests_mock.get(f"https://example.com/{name}.txt", text=name)
+    # Picking the inputs to batch must not look at the files of every input
+    monkeypatch.setattr(
+        InputInfo, "is_downloaded", lambda self: pytest.fail("files were checked")
+    )
+
+    assert valohai.inputs("first").stream().read() == b"first"
+    assert valohai.inputs("second").stream().read() == b"second"
+
+    input_requests = [r for r in requests_mock.request_history if r.method == "POST"]
+    assert len(input_requests) == 1
+    assert sorted(input_requests[0].qs["inputs"]) == sorted(input_ids.values())
+
+
+def test_download_concurrently(tmpdir, monkeypatch, requests_mock):
+    inputs_dir = str(tmpdir.mkdir("inputs"))
+    monkeypatch.setenv("VH_INPUTS_DIR", inputs_dir)
+
+    urls = [f"https://example.com/shards/shard-{i:03d}.bin" for i in range(50)]
+    for url in urls:
+        requests_mock.get(url, content=url.encode())
+
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    valohai.prepare(
+        step="test", default_inputs={"shards": urls}, download_concurrency=8
+    )
+
+    paths = list(valohai.inputs("shards").paths())
+    assert [os.path.basename(p) for p in paths] == [
+        f"shard-{i:03d}.bin" for i in range(50)
+    ]
+    for url, path in zip(urls, paths):
+        with open(path, "rb") as f:
+            assert f.read() == url.encode()
+    assert requests_mock.call_count == 50
+
+
+def _write_partial_download(path, data, state):
+    with open(get_state_path(path, ".part", create=True), "wb") as f:
+        f.write(data)
+    with open(get_state_path(path, ".part.json"), "w") as f:
+        json.dump(state, f)
+
+
+def test_download_resumes_partial_file(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/big.bin"
+    content = b"0123456789" * 10
+    path = str(tmpdir.join("big.bin"))
+    _write_partial_download(
+        path, content[:40], {"etag": '"abc"', "last_modified": None, "size": 100}
+    )
+    requests_mock.get(
+        url,
+        status_code=206,
+        content=content[40:],
+        headers={"ETag": '"abc"', "Content-Range": "bytes 40-99/100"},
+    )
+
+    download_url(url, path)
+
+    assert requests_mock.last_request.headers["Range"] == "bytes=40-"
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(get_state_path(path, ".part"))
+    assert not os.path.exists(get_state_path(path, ".part.json"))
+
+
+def test_download_restarts_when_object_changed(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/big.bin"
+    content = b"abcdefghij" * 10
+    path = str(tmpdir.join("big.bin"))
+    _write_partial_download(
+        path, b"x" * 40, {"etag": '"old"', "last_modified": None, "size": 100}
+    )
+    requests_mock.get(
+        url,
+        [
+            {
+                "status_code": 206,
+                "content": content[40:],
+                "headers": {"ETag": '"new"', "Content-Range": "bytes 40-99/100"},
+            },
+            {"content": content, "headers": {"ETag": '"new"'}},
+        ],
+    )
+
+    download_url(url, path)
+
+    assert requests_mock.call_count == 2
+    assert requests_mock.request_history[0].headers["If-Range"] == '"old"'
+    assert "Range" not in requests_mock.last_request.headers
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+
+def test_download_restarts_within_a_single_slot(tmpdir, monkeypatch, requests_mock):
+    import threading
+
+    from valohai.internals.download import download_url
+
+    monkeypatch.setenv("VH_HOST_DOWNLOAD_CONCURRENCY", "1")
+    monkeypatch.setenv("VH_DOWNLOAD_SLOT_DIR", str(tmpdir.mkdir("slots")))
+    url = "https://example.com/big.bin"
+    content = b"abcdefghij" * 10
+    path = str(tmpdir.join("big.bin"))
+    _write_partial_download(
+        path, b"x" * 40, {"etag": '"old"', "last_modified": None, "size": 100}
+    )
+    requests_mock.get(
+        url,
+        [
+            {"status_code": 416, "headers": {"Content-Range": "bytes */30"}},
+            {"content": content, "headers": {"ETag": '"new"'}},
+        ],
+    )
+
+    # The restart must not wait for a second slot while holding the only one
+    thread = threading.Thread(target=download_url, args=(url, path), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert requests_mock.call_count == 2
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+
+def test_interrupted_download_keeps_partial_file(tmpdir, monkeypatch, requests_mock):
+    from valohai.internals.download import download_url
+
+    monkeypatch.setenv("VH_DOWNLOAD_ATTEMPTS", "1")
+
+    url = "https://example.com/big.bin"
+    path = str(tmpdir.join("big.bin"))
+
+    class BrokenStream(io.BytesIO):
+        def read(self, *args, **kwargs):
+            data = super().read(*args, **kwargs)
+            if not data:
+                raise ConnectionResetError("connection reset")
+            return data
+
+    requests_mock.get(
+        url,
+        body=BrokenStream(b"x" * (2 * 1048576 + 10)),
+        headers={"ETag": '"abc"', "Content-Length": str(4 * 1048576)},
+    )
+    with pytest.raises(Exception):  # noqa: B017
+        download_url(url, path)
+    assert not os.path.exists(path)
+    assert os.path.getsize(get_state_path(path, ".part")) == 2 * 1048576
+    with open(get_state_path(path, ".part.json")) as f:
+        assert json.load(f)["etag"] == '"abc"'
+
+
+def test_download_retries_transient_errors(tmpdir, monkeypatch, requests_mock):
+    from valohai.internals import download
+    from valohai.internals.download import download_url
+
+    monkeypatch.setattr(download, "RETRY_BASE_DELAY", 0)
+    url = "https://example.com/flaky.txt"
+    requests_mock.get(
+        url,
+        [
+            {"status_code": 503},
+            {"exc": requests.exceptions.ConnectionError},
+            {"text": "finally"},
+        ],
+    )
+    path = download_url(url, str(tmpdir.join("flaky.txt")))
+    with open(path) as f:
+        assert f.read() == "finally"
+    assert requests_mock.call_count == 3
+
+
+def test_download_does_not_retry_client_errors(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    requests_mock.get("https://example.com/missing.txt", status_code=404)
+    with pytest.raises(requests.exceptions.HTTPError):
+        download_url("https://example.com/missing.txt", str(tmpdir.join("missing.txt")))
+    assert requests_mock.call_count == 1
+
+
+def test_download_refreshes_expired_urls(tmpdir, monkeypatch, requests_mock):
+    from valohai.internals import download_urls
+    from valohai.internals.input_info import FileInfo, InputInfo
+
+    requests_mock.get("https://example.com/a.txt?signature=old", status_code=403)
+    requests_mock.get("https://example.com/b.txt?signature=old", status_code=403)
+    requests_mock.get("https://example.com/a.txt?signature=new", text="a")
+    requests_mock.get("https://example.com/b.txt?signature=new", text="b")
+    refreshes = []
+
+    def request_batch_download_urls(input_ids):
+        refreshes.append(input_ids)
+        return {
+            "123": {
+                "a.txt": "https://example.com/a.txt?signature=new",
+                "b.txt": "https://example.com/b.txt?signature=new",
+            }
+        }
+
+    monkeypatch.setattr(download_urls, "_cache", {})
+    monkeypatch.setattr(
+        download_urls, "request_batch_download_urls", request_batch_download_urls
+    )
+    ii = InputInfo(
+        files=[FileInfo(name="a.txt"), FileInfo(name="b.txt")], input_id="123"
+    )
+    for f in ii.files:
+        f.download_url = f"https://example.com/{f.name}?signature=old"
+    for f in ii.files:
+        ii.download_file(f, str(tmpdir))
+
+    assert [Path(f.path).read_text() for f in ii.files] == ["a", "b"]
+    assert refreshes == [["123"]]
+
+
+def test_killed_preallocated_download_is_not_resumed(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/big.bin"
+    content = b"0123456789" * 10
+    path = str(tmpdir.join("big.bin"))
+    # A part file that was preallocated but never truncated to what was received
+    _write_partial_download(
+        path,
+        content[:30] + b"\0" * 70,
+        {"etag": '"abc"', "last_modified": None, "size": 100, "preallocated": True},
+    )
+    requests_mock.get(url, content=content, headers={"ETag": '"abc"'})
+
+    download_url(url, path)
+
+    assert "Range" not in requests_mock.last_request.headers
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(get_state_path(path, ".part.json"))
+
+
+def test_cleanup_partial_downloads(tmpdir):
+    from valohai.internals.download import cleanup_partial_downloads
+
+    state = {"etag": '"abc"', "last_modified": None, "size": 100}
+    state_dir = tmpdir.join(".valohai-download")
+    tmpdir.join("done.bin").write("done")
+    _write_partial_download(str(tmpdir.join("done.bin")), b"do", state)
+    state_dir.join("unresumable.bin.part").write("x")
+    _write_partial_download(str(tmpdir.join("resumable.bin")), b"x", state)
+    state_dir.join("lonely.bin.part.json").write("{}")
+    for file in state_dir.listdir():
+        os.utime(file, (0, 0))
+    state_dir.join("in-progress.bin.part").write("x")
+
+    cleanup_partial_downloads(str(tmpdir))
+
+    assert sorted(f.basename for f in tmpdir.listdir()) == [
+        ".valohai-download",
+        "done.bin",
+    ]
+    assert sorted(f.basename for f in state_dir.listdir()) == [
+        "in-progress.bin.part",
+        "resumable.bin.part",
+        "resumable.bin.part.json",
+    ]
+
+
+def _mock_ranged_object(requests_mock, url, content, etag='"abc"'):
+    def respond(request, context):
+        context.headers["ETag"] = etag
+        context.headers["Accept-Ranges"] = "bytes"
+        range_header = request.headers.get("Range")
+        if not range_header:
+            context.headers["Content-Length"] = str(len(content))
+            return content
+        start, _, end = range_header.removeprefix("bytes=").partition("-")
+        start, end = int(start), int(end) if end else len(content) - 1
+        context.status_code = 206
+        context.headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+        context.headers["Content-Length"] = str(end - start + 1)
+        return content[start : end + 1]
+
+    requests_mock.get(url, content=respond)
+
+
+def test_segmented_download(tmpdir, monkeypatch, requests_mock):
+    from valohai.internals.download import download_url
+
+    monkeypatch.setenv("VH_DOWNLOAD_SEGMENTS", "4")
+    monkeypatch.setenv("VH_DOWNLOAD_SEGMENT_MIN_SIZE", "1000")
+    url = "https://example.com/checkpoint.bin"
+    content = os.urandom(10_000)
+    _mock_ranged_object(requests_mock, url, content)
+
+    path = download_url(url, str(tmpdir.join("checkpoint.bin")))
+
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert requests_mock.call_count == 4
+    assert sorted(
+        rq.headers.get("Range", "") for rq in requests_mock.request_history
+    ) == ["", "bytes=2500-4999", "bytes=5000-7499", "bytes=7500-9999"]
+
+
+def test_segmented_download_falls_back_without_range_support(
+    tmpdir, monkeypatch, requests_mock
+):
+    from valohai.internals.download import download_url
+
+    monkeypatch.setenv("VH_DOWNLOAD_SEGMENTS", "4")
+    monkeypatch.setenv("VH_DOWNLOAD_SEGMENT_MIN_SIZE", "1000")
+    url = "https://example.com/checkpoint.bin"
+    content = os.urandom(10_000)
+    requests_mock.get(
+        url,
+        content=content,
+        headers={"ETag": '"abc"', "Content-Length": str(len(content))},
+    )
+
+    path = download_url(url, str(tmpdir.join("checkpoint.bin")))
+
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert requests_mock.call_count == 1
+
+
+def test_download_verifies_checksum(tmpdir, requests_mock):
+    from valohai.internals.checksums import ChecksumMismatch
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/data.bin"
+    path = str(tmpdir.join("data.bin"))
+    requests_mock.get(url, content=b"abcd")
+
+    with pytest.raises(ChecksumMismatch):
+        download_url(url, path, checksums={"md5": "0" * 32})
+    assert not os.path.exists(path)
+    assert not os.path.exists(get_state_path(path, ".part"))
+
+    download_url(url, path, checksums={"md5": "e2fc714c4727ee9395f324cd2e7f331f"})
+    with open(path, "rb") as f:
+        assert f.read() == b"abcd"
+
+
+def test_hash_file(tmpdir):
+    from valohai.internals.checksums import hash_file
+    from valohai.internals.utils import get_sha256_hash
+
+    path = tmpdir.join("data.bin")
+    path.write_binary(b"abcd")
+    assert hash_file(str(path), "md5") == "e2fc714c4727ee9395f324cd2e7f331f"
+    assert (
+        get_sha256_hash(str(path))
+        == "88d4266fd4e6338d13b845fcf289579d209c897823b9217da3e161936f031589"
+    )
+
+
+def test_resumed_download_verifies_checksum(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/data.bin"
+    path = str(tmpdir.join("data.bin"))
+    _write_partial_download(
+        path, b"ab", {"etag": '"abc"', "last_modified": None, "size": 4}
+    )
+    requests_mock.get(
+        url,
+        status_code=206,
+        content=b"cd",
+        headers={"ETag": '"abc"', "Content-Range": "bytes 2-3/4"},
+    )
+    download_url(
+        url,
+        path,
+        checksums={
+            "sha256": "88d4266fd4e6338d13b845fcf289579d209c897823b9217da3e161936f031589"
+        },
+    )
+    with open(path, "rb") as f:
+        assert f.read() == b"abcd"
+
+
+def test_revalidate_unchanged_file(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/data.bin"
+    path = str(tmpdir.join("data.bin"))
+    requests_mock.get(
+        url,
+        [
+            {"content": b"data", "headers": {"ETag": '"v1"'}},
+            {"status_code": 304, "headers": {"ETag": '"v1"'}},
+        ],
+    )
+
+    download_url(url, path)
+    assert os.path.isfile(get_state_path(path, ".validators.json"))
+    download_url(url, path, revalidate=True)
+
+    assert requests_mock.call_count == 2
+    assert requests_mock.last_request.headers["If-None-Match"] == '"v1"'
+    with open(path, "rb") as f:
+        assert f.read() == b"data"
+
+
+def test_revalidate_changed_file(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/data.bin"
+    path = str(tmpdir.join("data.bin"))
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+    requests_mock.get(url, content=b"data", headers={"Last-Modified": last_modified})
+    download_url(url, path)
+
+    requests_mock.get(url, content=b"new data", headers={"ETag": '"v2"'})
+    download_url(url, path, revalidate=True)
+
+    # The conditional request, and the download itself
+    assert requests_mock.call_count == 3
+    assert (
+        requests_mock.request_history[1].headers["If-Modified-Since"] == last_modified
+    )
+    assert "If-Modified-Since" not in requests_mock.last_request.headers
+    with open(path, "rb") as f:
+        assert f.read() == b"new data"
+
+    # A file modified locally is downloaded again, whatever the server says
+    with open(path, "ab") as f:
+        f.write(b"!")
+    download_url(url, path, revalidate=True)
+    assert requests_mock.call_count == 4
+    with open(path, "rb") as f:
+        assert f.read() == b"new data"
+
+
+def test_only_damaged_files_are_downloaded_again(tmpdir, monkeypatch, requests_mock):
+    from valohai.internals.download_type import DownloadType
+    from valohai.internals.input_info import FileInfo, InputInfo
+
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir))
+    md5 = "e2fc714c4727ee9395f324cd2e7f331f"  # abcd
+    ii = InputInfo(
+        FileInfo(
+            name=name,
+            uri=f"https://example.com/{name}",
+            path=str(tmpdir.join("data", name)),
+            size=4,
+            checksums={"md5": md5},
+        )
+        for name in ("a.bin", "b.bin")
+    )
+    tmpdir.mkdir("data").join("a.bin").write("abcd")
+    tmpdir.join("data", "b.bin").write("ab")  # truncated
+    requests_mock.get("https://example.com/b.bin", content=b"abcd")
+
+    assert [f.is_downloaded() for f in ii.files] == [True, False]
+    ii.download_if_necessary("data", DownloadType.OPTIONAL)
+    assert requests_mock.call_count == 1
+    assert tmpdir.join("data", "b.bin").read() == "abcd"
+
+    # With checksum verification, a file of the right size but wrong content is caught too
+    tmpdir.join("data", "a.bin").write("abce")
+    assert [f.is_downloaded() for f in ii.files] == [True, True]
+    monkeypatch.setenv("VH_VERIFY_CACHED_INPUTS", "true")
+    assert [f.is_downloaded() for f in ii.files] == [False, True]
+
+
+def test_download_fails_over_to_mirror(tmpdir, monkeypatch, requests_mock):
+    from valohai.internals.download import download_url
+
+    monkeypatch.setenv("VH_DOWNLOAD_ATTEMPTS", "1")
+    requests_mock.get("https://primary.example.com/data.bin", status_code=500)
+    requests_mock.get("https://mirror.example.com/data.bin", content=b"data")
+    path = str(tmpdir.join("data.bin"))
+
+    download_url(
+        "https://primary.example.com/data.bin",
+        path,
+        mirrors=["https://mirror.example.com/data.bin"],
+    )
+
+    with open(path, "rb") as f:
+        assert f.read() == b"data"
+    assert sorted(os.listdir(str(tmpdir))) == [".valohai-download", "data.bin"]
+    assert os.listdir(str(tmpdir.join(".valohai-download"))) == []
+
+
+@pytest.mark.parametrize("host_concurrency", [None, "1"])
+def test_download_races_slow_primary_against_mirror(
+    tmpdir, monkeypatch, host_concurrency
+):
+    import time
+
+    from benchmarks.server import ServerConfig, StandInServer, get_content
+    from valohai.internals.download import download_url
+
+    monkeypatch.setenv("VH_DOWNLOAD_HEDGE_DELAY", "0.1")
+    if host_concurrency:
+        # The mirror runs in the slot the primary holds, instead of queueing for another
+        monkeypatch.setenv("VH_HOST_DOWNLOAD_CONCURRENCY", host_concurrency)
+        monkeypatch.setenv("VH_DOWNLOAD_SLOT_DIR", str(tmpdir.mkdir("slots")))
+    path = str(tmpdir.join("data.bin"))
+    with StandInServer(ServerConfig(latency=2)) as primary, StandInServer() as mirror:
+        started_at = time.monotonic()
+        download_url(
+            primary.url_for("data.bin", 10000),
+            path,
+            mirrors=[mirror.url_for("data.bin", 10000)],
+        )
+        assert time.monotonic() - started_at < 2
+    with open(path, "rb") as f:
+        assert f.read() == get_content(10000)
+    assert not os.path.exists(get_state_path(path, ".mirror1"))
+
+
+def test_download_with_mirrors_resumes_partial_file(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    url = "https://example.com/big.bin"
+    content = b"0123456789" * 10
+    path = str(tmpdir.join("big.bin"))
+    _write_partial_download(
+        path, content[:40], {"etag": '"abc"', "last_modified": None, "size": 100}
+    )
+    requests_mock.get(
+        url,
+        status_code=206,
+        content=content[40:],
+        headers={"ETag": '"abc"', "Content-Range": "bytes 40-99/100"},
+    )
+
+    download_url(url, path, mirrors=["https://mirror.example.com/big.bin"])
+
+    assert requests_mock.last_request.headers["Range"] == "bytes=40-"
+    with open(path, "rb") as f:
+        assert f.read() == content
+    assert sorted(os.listdir(str(tmpdir))) == [".valohai-download", "big.bin"]
+    assert os.listdir(str(tmpdir.join(".valohai-download"))) == [
+        "big.bin.validators.json"
+    ]
+
+
+def test_file_uri_is_linked(tmpdir, monkeypatch):
+    from valohai.internals.download import download_url
+
+    source = tmpdir.mkdir("shared").join("data.bin")
+    source.write_binary(b"data")
+    path = str(tmpdir.join("inputs", "data.bin"))
+
+    download_url(f"file://{source}", path)
+    assert os.path.samefile(path, str(source))
+
+    # Across filesystems, where hardlinks can't be made, the file is symlinked
+    monkeypatch.setattr(os, "link", _fail_cross_device)
+    download_url(f"file://{source}", path, force_download=True)
+    assert os.path.islink(path)
+    assert os.path.samefile(path, str(source))
+
+    monkeypatch.setenv("VH_COPY_LOCAL_INPUTS", "true")
+    download_url(f"file://{source}", path, force_download=True)
+    assert not os.path.islink(path)
+    assert not os.path.samefile(path, str(source))
+    with open(path, "rb") as f:
+        assert f.read() == b"data"
+
+
+def test_file_uri_default_input_is_used_in_place(tmpdir, monkeypatch):
+    source = tmpdir.join("data.bin")
+    source.write_binary(b"data")
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+
+    valohai.prepare(step="test", default_inputs={"local": f"file://{source}"})
+
+    assert valohai.inputs("local").path() == str(source)
+
+
+def _fail_cross_device(src, dst):
+    raise OSError(18, "Invalid cross-device link")
+
+
+def _make_tar_gz(members):
+    import tarfile
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tf:
+        for name, content in members:
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = len(content)
+            tf.addfile(tarinfo, io.BytesIO(content))
+    return archive.getvalue()
+
+
+def test_tar_input_is_extracted_on_download(tmpdir, monkeypatch, requests_mock):
+    inputs_dir = str(tmpdir.mkdir("inputs"))
+    monkeypatch.setenv("VH_INPUTS_DIR", inputs_dir)
+    monkeypatch.setenv("VH_EXTRACT_ON_DOWNLOAD", "true")
+    url = "https://example.com/data.tar.gz"
+    requests_mock.get(
+        url, content=_make_tar_gz([("a.txt", b"hello"), ("sub/b.txt", b"world")])
+    )
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    valohai.prepare(step="test", default_inputs={"data": url})
+
+    extraction_dir = os.path.join(inputs_dir, "data", ".data.tar.gz.extracted")
+    for _ in range(2):
+        paths = sorted(valohai.inputs("data").paths())
+        assert paths == [
+            os.path.join(extraction_dir, "a.txt"),
+            os.path.join(extraction_dir, "sub", "b.txt"),
+        ]
+        assert [Path(path).read_bytes() for path in paths] == [b"hello", b"world"]
+    assert requests_mock.call_count == 1
+    # The archive itself never hit the disk
+    assert not os.path.exists(os.path.join(inputs_dir, "data", "data.tar.gz"))
+
+    # Unless it is wanted as is
+    assert valohai.inputs("data").path(process_archives=False) == os.path.join(
+        inputs_dir, "data", "data.tar.gz"
+    )
+    assert requests_mock.call_count == 2
+
+
+def test_extracted_archives_do_not_collide(tmpdir, monkeypatch, requests_mock):
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setenv("VH_EXTRACT_ON_DOWNLOAD", "true")
+    urls = []
+    for split in ("train", "val"):
+        url = f"https://example.com/{split}.tar.gz"
+        requests_mock.get(url, content=_make_tar_gz([("labels.csv", split.encode())]))
+        urls.append(url)
+    requests_mock.get("https://example.com/labels.csv", content=b"input")
+    urls.append("https://example.com/labels.csv")
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    valohai.prepare(step="test", default_inputs={"data": urls})
+
+    paths = list(valohai.inputs("data").paths())
+
+    assert [Path(path).read_bytes() for path in paths] == [b"train", b"val", b"input"]
+    # Named like the members of the archives would be
+    assert [f.name for f in get_input_vfs("data").files] == ["labels.csv"] * 3
+
+
+def test_extraction_refuses_members_outside_the_directory(tmpdir):
+    import tarfile
+
+    from valohai.internals.extraction import extract_tar_stream
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tf:
+        for name in ("fine.txt", "../escaped.txt"):
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = 4
+            tf.addfile(tarinfo, io.BytesIO(b"data"))
+    archive.seek(0)
+
+    with pytest.raises(ValueError, match="outside of the archive"):
+        extract_tar_stream(archive, str(tmpdir.mkdir("inputs").join("data.tar")))
+    assert not os.path.exists(str(tmpdir.join("escaped.txt")))
+    assert not os.path.exists(str(tmpdir.join("inputs", ".data.tar.extracted")))
+
+
+def test_datums_are_resolved_once(monkeypatch):
+    from valohai.internals import download
+
+    datum_obj = {"id": "1234", "name": "model.pkl", "sha256": "abcd"}
+    resolve_datum = []
+    monkeypatch.setattr(
+        download,
+        "resolve_datum",
+        lambda id_or_alias: resolve_datum.append(id_or_alias) or datum_obj,
+    )
+    assert download.resolve_datums(["my-alias", "1234"]) == {
+        "my-alias": datum_obj,
+        "1234": datum_obj,
+    }
+    resolve_datum.clear()
+    assert download.get_datum("my-alias") == datum_obj
+    assert download.get_datum("1234") == datum_obj
+    assert not resolve_datum
@@ -0,0 +1,77 @@
+import io
+import os
+import threading
+import time
+
+from valohai.internals.download import download_url
+from valohai.internals.download_locks import download_slot, get_state_path, lock_file
+
+
+def test_lock_file_is_removed_after_use(tmpdir):
+    path = str(tmpdir.join("a.txt"))
+    with lock_file(path) as waited:
+        assert not waited
+        assert os.path.exists(get_state_path(path, ".lock"))
+    assert not os.path.exists(get_state_path(path, ".lock"))
+    assert os.listdir(str(tmpdir)) == [".valohai-download"]
+
+
+def test_concurrent_downloads_of_same_file_are_deduplicated(tmpdir, requests_mock):
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowBody(io.BytesIO):
+        def read(self, *args, **kwargs):
+            started.set()
+            release.wait(timeout=10)
+            return super().read(*args, **kwargs)
+
+    url = "https://example.com/big.bin"
+    requests_mock.get(url, body=SlowBody(b"data"), headers={"Content-Length": "4"})
+    path = str(tmpdir.join("big.bin"))
+    results = []
+
+    def download():
+        results.append(download_url(url, path))
+
+    first = threading.Thread(target=download)
+    first.start()
+    assert started.wait(timeout=10)
+    second = threading.Thread(target=download)
+    second.start()
+    time.sleep(0.1)
+    assert not results  # the second download is waiting for the first one
+    release.set()
+    first.join(timeout=10)
+    second.join(timeout=10)
+
+    assert results == [path, path]
+    assert requests_mock.call_count == 1
+    with open(path, "rb") as f:
+        assert f.read() == b"data"
+
+
+def test_download_slots_cap_concurrent_transfers(tmpdir, monkeypatch):
+    monkeypatch.setenv("VH_HOST_DOWNLOAD_CONCURRENCY", "2")
+    monkeypatch.setenv("VH_DOWNLOAD_SLOT_DIR", str(tmpdir))
+    lock = threading.Lock()
+    active = []
+    max_active = []
+
+    def transfer():
+        with download_slot():
+            with lock:
+                active.append(1)
+                max_active.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=transfer) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(max_active) == 6
+    assert max(max_active) == 2
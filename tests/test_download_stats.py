@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+
+import valohai
+from valohai.internals import download, global_state
+
+
+def test_download_stats(tmpdir, monkeypatch, requests_mock, capsys):
+    inputs_dir = tmpdir.mkdir("inputs")
+    monkeypatch.setenv("VH_INPUTS_DIR", str(inputs_dir))
+    monkeypatch.setenv("VH_LOG_DOWNLOAD_STATS", "true")
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    monkeypatch.setattr(download, "RETRY_BASE_DELAY", 0)
+    inputs_dir.mkdir("data").join("cached.txt").write("cached")
+    requests_mock.get("https://example.com/a.txt?signature=secret", text="a" * 100)
+    requests_mock.get(
+        "https://example.com/flaky.txt",
+        [{"status_code": 503}, {"text": "b" * 50}],
+    )
+    valohai.downloads.clear()
+    valohai.prepare(
+        step="test",
+        default_inputs={
+            "data": [
+                "https://example.com/a.txt?signature=secret",
+                "https://example.com/flaky.txt",
+                "https://example.com/cached.txt",
+            ]
+        },
+        download_concurrency=1,
+    )
+    try:
+        list(valohai.inputs("data").paths())
+    finally:
+        global_state.flush_global_state()
+
+    records = {os.path.basename(r.path): r for r in valohai.downloads.records}
+    assert records["a.txt"].url == "https://example.com/a.txt"
+    assert records["a.txt"].bytes_downloaded == records["a.txt"].size == 100
+    assert records["a.txt"].time_to_first_byte is not None
+    assert records["a.txt"].throughput > 0
+    assert records["flaky.txt"].retries == 1
+    assert records["flaky.txt"].bytes_downloaded == 50
+    assert records["cached.txt"].cache_hit
+    assert records["cached.txt"].bytes_downloaded == 0
+
+    summary = valohai.downloads.summary()
+    assert summary["download_files"] == 3
+    assert summary["download_bytes"] == 150
+    assert summary["download_cache_hits"] == 1
+    assert summary["download_retries"] == 1
+
+    metadata = [
+        json.loads(line)
+        for line in capsys.readouterr().out.splitlines()
+        if line.startswith("{")
+    ]
+    assert len(metadata) == 1
+    assert metadata[0]["download_input"] == "data"
+    assert metadata[0]["download_files"] == 3
+    assert metadata[0]["download_bytes"] == 150
+
+
+def test_waiting_is_not_counted_as_time_to_first_byte(
+    tmpdir, monkeypatch, requests_mock
+):
+    import contextlib
+    import time
+
+    from valohai.internals.download_stats import get_download_records
+
+    @contextlib.contextmanager
+    def slow_download_slot():
+        time.sleep(0.5)  # queueing for a host-wide download slot
+        yield
+
+    monkeypatch.setattr(download, "download_slot", slow_download_slot)
+    requests_mock.get("https://example.com/a.txt", text="a")
+    path = str(tmpdir.join("a.txt"))
+    valohai.downloads.clear()
+
+    download.download_url("https://example.com/a.txt", path)
+
+    [record] = get_download_records()
+    assert record.wait_time >= 0.5
+    assert record.time_to_first_byte < 0.5
+    assert record.duration < 0.5
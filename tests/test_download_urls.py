@@ -0,0 +1,48 @@
+import pytest
+
+from valohai.internals.download_urls import (
+    DEFAULT_URL_TTL,
+    EXPIRY_MARGIN,
+    get_url_expiry,
+    get_urls_expiry,
+)
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (
+            "https://bucket.s3.amazonaws.com/a.txt?X-Amz-Algorithm=AWS4-HMAC-SHA256"
+            "&X-Amz-Date=20240102T030405Z&X-Amz-Expires=3600&X-Amz-Signature=abc",
+            1704164645 + 3600,
+        ),
+        (
+            "https://storage.googleapis.com/bucket/a.txt?x-goog-date=20240102T030405Z"
+            "&x-goog-expires=600&x-goog-signature=abc",
+            1704164645 + 600,
+        ),
+        (
+            "https://bucket.s3.amazonaws.com/a.txt?Expires=1704164645&Signature=abc",
+            1704164645,
+        ),
+        (
+            "https://account.blob.core.windows.net/c/a.txt?sv=2021-08-06"
+            "&se=2024-01-02T03:04:05Z&sig=abc",
+            1704164645,
+        ),
+        ("https://example.com/a.txt", None),
+        ("https://example.com/a.txt?X-Amz-Date=garbage&X-Amz-Expires=60", None),
+    ],
+)
+def test_get_url_expiry(url, expected):
+    assert get_url_expiry(url) == expected
+
+
+def test_get_urls_expiry():
+    urls = [
+        "https://example.com/a.txt?Expires=2000",
+        "https://example.com/b.txt?Expires=1000",
+        "https://example.com/c.txt",
+    ]
+    assert get_urls_expiry(urls, now=0) == 1000 - EXPIRY_MARGIN
+    assert get_urls_expiry(urls[2:], now=0) == DEFAULT_URL_TTL - EXPIRY_MARGIN
@@ -0,0 +1,39 @@
+import os
+
+from valohai.internals import http_client
+from valohai.internals.http_client import get_http_session, reset_http_session
+
+
+def test_session_is_shared():
+    reset_http_session()
+    assert get_http_session() is get_http_session()
+
+
+def test_session_is_recreated_in_child_process(monkeypatch):
+    reset_http_session()
+    session = get_http_session()
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert get_http_session() is not session
+    reset_http_session()
+
+
+def test_session_pool_configuration(monkeypatch):
+    monkeypatch.setenv("VH_HTTP_POOL_CONNECTIONS", "3")
+    monkeypatch.setenv("VH_HTTP_POOL_MAXSIZE", "32")
+    monkeypatch.setenv("VH_HTTP_KEEPALIVE", "false")
+    session = http_client._create_session()
+    adapter = session.get_adapter("https://example.com/")
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 32
+    assert session.headers["Connection"] == "close"
+
+
+def test_session_is_used_for_downloads(tmpdir, requests_mock):
+    from valohai.internals.download import download_url
+
+    reset_http_session()
+    requests_mock.get("https://example.com/a.txt", text="hello")
+    path = download_url("https://example.com/a.txt", str(tmpdir.join("a.txt")))
+    with open(path) as f:
+        assert f.read() == "hello"
+    assert requests_mock.call_count == 1
@@ -0,0 +1,125 @@
+import os
+import shutil
+import sys
+
+import valohai
+from valohai.internals import input_cache
+
+
+def test_input_cache_is_shared_across_steps(tmpdir, monkeypatch, requests_mock):
+    cache_dir = str(tmpdir.mkdir("cache"))
+    monkeypatch.setenv("VH_INPUT_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    url = "https://example.com/dataset.csv"
+    requests_mock.get(url, text="a,b,c")
+
+    paths = []
+    for step in ("first", "second", "third"):
+        monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.join(step)))
+        valohai.prepare(step=step, default_inputs={"dataset": url})
+        paths.append(valohai.inputs("dataset").path())
+
+    assert requests_mock.call_count == 1
+    assert len(set(paths)) == 3
+    for path in paths:
+        with open(path) as f:
+            assert f.read() == "a,b,c"
+    key = input_cache.get_cache_key(url, {})
+    assert os.path.samefile(paths[0], input_cache.get_object_path(cache_dir, key))
+
+
+def test_input_cache_evicts_least_recently_used(tmpdir):
+    cache_dir = str(tmpdir.mkdir("cache"))
+    for i, key in enumerate(("uri-aa", "uri-bb", "uri-cc", "uri-dd")):
+        source = tmpdir.join(f"{key}.bin")
+        source.write_binary(b"x" * 100)
+        input_cache.store(cache_dir, key, str(source))
+        source.remove()
+        object_path = input_cache.get_object_path(cache_dir, key)
+        os.utime(input_cache.get_used_marker_path(object_path), (i, i))
+
+    # Using a file makes it the most recently used one, without touching the file itself
+    used_path = str(tmpdir.join("used.bin"))
+    object_path = input_cache.get_object_path(cache_dir, "uri-aa")
+    mtime_ns = os.stat(object_path).st_mtime_ns
+    assert input_cache.materialize(cache_dir, "uri-aa", used_path)
+    assert os.stat(used_path).st_mtime_ns == mtime_ns
+    os.remove(used_path)
+    # Files still linked from elsewhere are kept, as removing them would free nothing
+    linked_path = str(tmpdir.join("linked.bin"))
+    assert input_cache.materialize(cache_dir, "uri-bb", linked_path)
+    os.utime(
+        input_cache.get_used_marker_path(
+            input_cache.get_object_path(cache_dir, "uri-bb")
+        ),
+        (0, 0),
+    )
+    input_cache.evict(cache_dir, max_size=300)
+
+    assert os.path.isfile(input_cache.get_object_path(cache_dir, "uri-aa"))
+    assert os.path.isfile(input_cache.get_object_path(cache_dir, "uri-bb"))
+    assert not os.path.isfile(input_cache.get_object_path(cache_dir, "uri-cc"))
+    assert os.path.isfile(input_cache.get_object_path(cache_dir, "uri-dd"))
+
+
+def test_input_cache_key():
+    assert input_cache.get_cache_key("s3://a/b", {"sha256": "ABC"}) == "sha256-abc"
+    assert input_cache.get_cache_key("s3://a/b", {}).startswith("uri-")
+    assert input_cache.get_cache_key("datum://foo", {}) is None
+    assert input_cache.get_cache_key(None, {}) is None
+
+
+def test_copy_file(tmpdir, monkeypatch):
+    source = tmpdir.join("source.bin")
+    source.write_binary(b"x" * 100000)
+
+    input_cache.copy_file(str(source), str(tmpdir.join("copy.bin")))
+    assert tmpdir.join("copy.bin").read_binary() == b"x" * 100000
+
+    # Without reflinks and copy_file_range(), the file is copied the ordinary way
+    monkeypatch.setattr(input_cache, "_reflink", lambda src, dst: False)
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    input_cache.copy_file(str(source), str(tmpdir.join("plain-copy.bin")))
+    assert tmpdir.join("plain-copy.bin").read_binary() == b"x" * 100000
+
+
+def test_input_cache_is_evicted_once_per_input(tmpdir, monkeypatch, requests_mock):
+    cache_dir = str(tmpdir.mkdir("cache"))
+    monkeypatch.setenv("VH_INPUT_CACHE_DIR", cache_dir)
+    monkeypatch.setenv("VH_INPUT_CACHE_MAX_SIZE", "250")
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    urls = [f"https://example.com/{i}.bin" for i in range(5)]
+    for url in urls:
+        requests_mock.get(url, content=b"x" * 100)
+    evictions = []
+    evict = input_cache.evict
+
+    def counting_evict(cache_dir, max_size):
+        evictions.append(cache_dir)
+        evict(cache_dir, max_size)
+
+    monkeypatch.setattr(input_cache, "evict", counting_evict)
+
+    valohai.prepare(step="test", default_inputs={"data": urls})
+    assert len(list(valohai.inputs("data").paths())) == 5
+
+    assert len(evictions) == 1
+    # The files are all linked from the input directory, so they are all kept
+    assert len(_list_cached_files(cache_dir)) == 5
+
+    # The total is kept for all the processes using the cache
+    assert input_cache._read_total_size(cache_dir) == 500
+    shutil.rmtree(str(tmpdir.join("inputs")))
+    input_cache.evict_if_necessary()
+    assert len(_list_cached_files(cache_dir)) == 2
+    assert input_cache._read_total_size(cache_dir) == 200
+
+
+def _list_cached_files(cache_dir):
+    return [
+        name
+        for _, _, names in os.walk(os.path.join(cache_dir, "objects"))
+        for name in names
+        if not name.endswith(input_cache.USED_SUFFIX)
+    ]
@@ -112,3 +112,113 @@ def test_zip_no_mangling(use_test_config_dir):
         "blerp/blonk/asdf.jpg",
     ):
         assert any(p.endswith(suffix) for p in paths)
+
+
+def test_path_filter_limits_downloads(tmpdir, monkeypatch, requests_mock):
+    import io
+    import sys
+    import zipfile
+
+    from valohai.internals import global_state
+
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("c.json", "{}")
+        zf.writestr("d.txt", "d")
+    requests_mock.get("https://example.com/a.json", text="{}")
+    requests_mock.get("https://example.com/b.txt", text="b")
+    requests_mock.get("https://example.com/e.zip", content=archive.getvalue())
+    urls = [
+        "https://example.com/a.json",
+        "https://example.com/b.txt",
+        "https://example.com/e.zip",
+    ]
+    valohai.prepare(step="test", default_inputs={"data": urls})
+    try:
+        paths = list(valohai.inputs("data").paths("*.json"))
+        unarchived_paths = list(
+            valohai.inputs("data").paths("*.json", process_archives=False)
+        )
+    finally:
+        global_state.flush_global_state()
+
+    assert [os.path.basename(p) for p in paths] == ["a.json", "c.json"]
+    assert [os.path.basename(p) for p in unarchived_paths] == ["a.json"]
+    assert {r.url for r in requests_mock.request_history} == {
+        "https://example.com/a.json",
+        "https://example.com/e.zip",
+    }
+
+
+def test_file_infos_are_kept_in_columns(monkeypatch):
+    from valohai.internals.input_info import InputInfo, _FileInfoView
+
+    checksums = {"md5": "e2fc714c4727ee9395f324cd2e7f331f"}
+    ii = InputInfo.from_json_data(
+        {
+            "files": [
+                {"name": f"{i}.txt", "size": i + 1, "checksums": checksums}
+                for i in range(1000)
+            ]
+        }
+    )
+    assert len(ii.files) == 1000
+
+    file = ii.files[500]
+    assert file.name == "500.txt"
+    assert file.size == 501
+    assert file.checksums == checksums
+    assert file.metadata == []
+    # The state of a file is kept in the list, not in the object
+    file.path = "/tmp/500.txt"
+    assert ii.files[500].path == "/tmp/500.txt"
+    assert ii.files[-500] == file
+    assert [f.name for f in ii.files[:2]] == ["0.txt", "1.txt"]
+    assert len(ii.get_files("99*.txt")) == 11
+
+    # Checking the whole input doesn't go through an object per file
+    monkeypatch.setattr(_FileInfoView, "__init__", None)
+    assert not ii.is_downloaded()
+    assert ii.needs_download()
+
+
+def test_compressed_files_are_decompressed(tmpdir, monkeypatch):
+    import bz2
+    import gzip
+    import lzma
+    import sys
+
+    from valohai.internals import global_state
+
+    data_dir = tmpdir.mkdir("data")
+    for module, extension in ((gzip, "gz"), (bz2, "bz2"), (lzma, "xz")):
+        data_dir.join(f"shard.{extension}.jsonl.{extension}").write_binary(
+            module.compress(b'{"shard": "%s"}\n' % extension.encode())
+        )
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    valohai.prepare(step="test", default_inputs={"data": str(data_dir.join("*"))})
+    try:
+        contents = sorted(
+            s.read() for s in valohai.inputs("data").streams(decompress=True)
+        )
+        path = valohai.inputs("data").path("shard.gz.jsonl", decompress=True)
+        compressed_path = valohai.inputs("data").path("shard.gz.jsonl")
+        # The filter also matches the stored (compressed) names
+        filtered_paths = list(
+            valohai.inputs("data").paths(path_filter="*.jsonl.gz", decompress=True)
+        )
+    finally:
+        global_state.flush_global_state()
+
+    assert contents == [
+        b'{"shard": "bz2"}\n',
+        b'{"shard": "gz"}\n',
+        b'{"shard": "xz"}\n',
+    ]
+    assert os.path.basename(path) == "shard.gz.jsonl"
+    with open(path, "rb") as f:
+        assert f.read() == b'{"shard": "gz"}\n'
+    assert compressed_path.endswith("shard.gz.jsonl.gz")
+    assert filtered_paths == [path]
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+
+import valohai
+from valohai.internals import global_state
+
+
+def test_async_input_api(tmpdir, monkeypatch, requests_mock):
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    urls = [f"https://example.com/records/{i}.json" for i in range(10)]
+    for i, url in enumerate(urls):
+        requests_mock.get(url, text=f'{{"id": {i}}}')
+    valohai.prepare(step="test", default_inputs={"records": urls})
+
+    async def main():
+        paths = [p async for p in valohai.inputs("records").apaths(concurrency=3)]
+        first = await valohai.inputs("records").apath("3.json")
+        contents = []
+        async for stream in valohai.inputs("records").astreams("*.json"):
+            with stream:
+                contents.append(stream.read())
+        missing = await valohai.inputs("nonexistent").apath(default="nope")
+        return paths, first, contents, missing
+
+    try:
+        paths, first, contents, missing = asyncio.run(main())
+    finally:
+        global_state.flush_global_state()
+
+    assert len(paths) == 10
+    assert first == paths[3]
+    assert contents == [f'{{"id": {i}}}'.encode() for i in range(10)]
+    assert missing == "nope"
+    assert requests_mock.call_count == 10
+
+
+def test_async_input_api_does_not_block_event_loop(tmpdir, monkeypatch, requests_mock):
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    requests_mock.get("https://example.com/a.txt", text="a")
+    valohai.prepare(step="test", default_inputs={"a": "https://example.com/a.txt"})
+    ticks = []
+
+    async def ticker():
+        for _ in range(3):
+            ticks.append(1)
+            await asyncio.sleep(0)
+
+    async def main():
+        path, _ = await asyncio.gather(valohai.inputs("a").apath(), ticker())
+        return path
+
+    try:
+        path = asyncio.run(main())
+    finally:
+        global_state.flush_global_state()
+
+    with open(path) as f:
+        assert f.read() == "a"
+    assert len(ticks) == 3
+
+
+def test_astream_closes_the_streams(monkeypatch):
+    from valohai.inputs import Input
+
+    closed = []
+
+    async def astreams(self, **kwargs):
+        try:
+            yield "first"
+            yield "second"
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = await Input("data").astream()
+        return stream, list(closed)
+
+    monkeypatch.setattr(Input, "astreams", astreams)
+    # Closed by the time astream() returns, not later by the event loop
+    assert asyncio.run(main()) == ("first", [True])
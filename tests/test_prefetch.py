@@ -0,0 +1,131 @@
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+import valohai
+from valohai.internals import global_state
+
+
+@pytest.fixture
+def prefetch_env(tmpdir, monkeypatch):
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    yield
+    global_state.flush_global_state()
+
+
+def test_prefetch_starts_downloads_in_prepare(prefetch_env, requests_mock):
+    requests_mock.get("https://example.com/a.txt", text="a")
+    valohai.prepare(
+        step="test",
+        default_inputs={"a": "https://example.com/a.txt"},
+        prefetch_inputs=True,
+    )
+    file_info = global_state.inputs["a"].files[0]
+    assert file_info.pending_download is not None
+    file_info.pending_download.result(timeout=10)
+    assert requests_mock.call_count == 1
+
+    path = valohai.inputs("a").path()
+    with open(path) as f:
+        assert f.read() == "a"
+    assert requests_mock.call_count == 1
+
+
+def test_prefetch_path_waits_only_for_its_file(prefetch_env, requests_mock):
+    release = threading.Event()
+
+    class SlowBody(io.BytesIO):
+        def read(self, *args, **kwargs):
+            release.wait(timeout=10)
+            return super().read(*args, **kwargs)
+
+    requests_mock.get("https://example.com/fast.txt", content=b"fast")
+    requests_mock.get("https://example.com/slow.txt", body=SlowBody(b"slow"))
+    valohai.prepare(
+        step="test",
+        default_inputs={
+            "data": ["https://example.com/fast.txt", "https://example.com/slow.txt"]
+        },
+        prefetch_inputs=True,
+    )
+
+    paths = valohai.inputs("data").paths()
+    fast_path = next(paths)
+    assert os.path.basename(fast_path) == "fast.txt"
+    assert not release.is_set()
+
+    release.set()
+    slow_path = next(paths)
+    with open(slow_path, "rb") as f:
+        assert f.read() == b"slow"
+
+
+def test_prefetch_failure_is_raised_on_access(prefetch_env, requests_mock):
+    requests_mock.get("https://example.com/missing.txt", status_code=404)
+    valohai.prepare(
+        step="test",
+        default_inputs={"missing": "https://example.com/missing.txt"},
+        prefetch_inputs=True,
+    )
+    with pytest.raises(Exception, match="404"):
+        valohai.inputs("missing").path()
+
+
+def test_failed_prefetch_is_downloaded_again(prefetch_env, requests_mock):
+    release = threading.Event()
+
+    class SlowBody(io.BytesIO):
+        def read(self, *args, **kwargs):
+            release.wait(timeout=10)
+            return super().read(*args, **kwargs)
+
+    requests_mock.get(
+        "https://example.com/a.txt",
+        [{"status_code": 404}, {"content": b"a"}],
+    )
+    requests_mock.get("https://example.com/b.txt", body=SlowBody(b"b"))
+    valohai.prepare(
+        step="test",
+        default_inputs={
+            "data": ["https://example.com/a.txt", "https://example.com/b.txt"]
+        },
+        prefetch_inputs=True,
+    )
+    with pytest.raises(Exception, match="404"):
+        next(valohai.inputs("data").paths())
+
+    # b.txt is still being prefetched, but a.txt is downloaded in the foreground
+    paths = valohai.inputs("data").paths()
+    with open(next(paths), "rb") as f:
+        assert f.read() == b"a"
+    release.set()
+    with open(next(paths), "rb") as f:
+        assert f.read() == b"b"
+
+
+def test_prefetch_extracts_archives(prefetch_env, monkeypatch, requests_mock):
+    import tarfile
+
+    monkeypatch.setenv("VH_EXTRACT_ON_DOWNLOAD", "true")
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tf:
+        tarinfo = tarfile.TarInfo("a.txt")
+        tarinfo.size = 1
+        tf.addfile(tarinfo, io.BytesIO(b"a"))
+    url = "https://example.com/data.tar.gz"
+    requests_mock.get(url, content=archive.getvalue())
+
+    for _ in range(2):
+        valohai.prepare(step="test", default_inputs={"data": url}, prefetch_inputs=True)
+        file_info = global_state.inputs["data"].files[0]
+        if file_info.pending_download:
+            file_info.pending_download.result(timeout=10)
+        assert not os.path.exists(file_info.path)  # unpacked, not stored
+        with open(valohai.inputs("data").path(), "rb") as f:
+            assert f.read() == b"a"
+        global_state.flush_global_state()
+    assert requests_mock.call_count == 1
@@ -0,0 +1,140 @@
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+
+import valohai
+from valohai.internals import global_state
+from valohai.internals.remote_file import RemoteFile
+
+
+def _mock_ranged_object(requests_mock, url, content, etag='"abc"'):
+    def respond(request, context):
+        context.headers["ETag"] = etag
+        range_header = request.headers.get("Range")
+        if not range_header:
+            context.headers["Content-Length"] = str(len(content))
+            return content
+        start, _, end = range_header.removeprefix("bytes=").partition("-")
+        start, end = int(start), min(int(end), len(content) - 1)
+        context.status_code = 206
+        context.headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+        context.headers["Content-Length"] = str(end - start + 1)
+        return content[start : end + 1]
+
+    requests_mock.get(url, content=respond)
+
+
+def _requested_ranges(requests_mock):
+    return [r.headers["Range"] for r in requests_mock.request_history]
+
+
+def test_remote_file_reads_blocks_on_demand(requests_mock):
+    url = "https://example.com/big.bin"
+    content = bytes(range(256)) * 40  # 10240 bytes
+    _mock_ranged_object(requests_mock, url, content)
+
+    f = RemoteFile(url, block_size=1024)
+    assert f.seek(-100, os.SEEK_END) == 10140
+    assert f.read() == content[-100:]
+    f.seek(1000)
+    assert f.read(100) == content[1000:1100]
+    f.seek(9000)
+    assert f.read(50) == content[9000:9050]
+
+    assert _requested_ranges(requests_mock) == [
+        "bytes=0-1023",  # finding out the size
+        "bytes=9216-10239",
+        "bytes=1024-2047",
+        "bytes=8192-9215",
+    ]
+
+
+def test_remote_file_evicts_least_recently_used_blocks(requests_mock):
+    url = "https://example.com/big.bin"
+    content = os.urandom(4096)
+    _mock_ranged_object(requests_mock, url, content)
+
+    f = RemoteFile(url, size=len(content), block_size=1024, max_blocks=2)
+    for offset in (0, 1024, 0, 2048, 0, 1024):
+        f.seek(offset)
+        assert f.read(1024) == content[offset : offset + 1024]
+
+    assert _requested_ranges(requests_mock) == [
+        "bytes=0-1023",
+        "bytes=1024-2047",
+        "bytes=2048-3071",
+        "bytes=1024-2047",
+    ]
+
+
+def test_remote_file_as_zip(requests_mock):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("small.txt", "hello")
+        zf.writestr("large.bin", os.urandom(100000))
+    url = "https://example.com/archive.zip"
+    _mock_ranged_object(requests_mock, url, buffer.getvalue())
+
+    with zipfile.ZipFile(RemoteFile(url, block_size=4096)) as zf:
+        assert zf.read("small.txt") == b"hello"
+
+    assert requests_mock.call_count < 5
+
+
+def test_remote_file_requires_range_support(requests_mock):
+    requests_mock.get("https://example.com/a.bin", content=b"data")
+    with pytest.raises(OSError, match="does not support range requests"):
+        RemoteFile("https://example.com/a.bin").read()
+
+
+def test_remote_file_detects_changed_object(requests_mock):
+    url = "https://example.com/big.bin"
+    _mock_ranged_object(requests_mock, url, b"x" * 2048, etag='"v1"')
+    f = RemoteFile(url, block_size=1024)
+    f.read(10)
+    _mock_ranged_object(requests_mock, url, b"y" * 2048, etag='"v2"')
+    f.seek(1024)
+    with pytest.raises(OSError, match="changed"):
+        f.read(10)
+
+
+def test_lazy_input_stream(tmpdir, monkeypatch, requests_mock):
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    content = os.urandom(10000)
+    _mock_ranged_object(requests_mock, "https://example.com/data.bin", content)
+    valohai.prepare(
+        step="test",
+        default_inputs={
+            "data": ["https://example.com/data.bin", "https://example.com/other.txt"]
+        },
+    )
+    try:
+        stream = valohai.inputs("data").stream("data.bin", lazy=True)
+        stream.seek(-10, os.SEEK_END)
+        assert stream.read() == content[-10:]
+        assert not os.path.exists(
+            os.path.join(valohai.inputs("data").dir_path(), "data.bin")
+        )
+    finally:
+        global_state.flush_global_state()
+
+    assert requests_mock.call_count == 1
+
+
+def test_lazy_input_stream_refuses_what_it_can_not_do(tmpdir, monkeypatch):
+    monkeypatch.setenv("VH_INPUTS_DIR", str(tmpdir.mkdir("inputs")))
+    monkeypatch.setattr(sys, "argv", ["myscript.py"])
+    valohai.prepare(
+        step="test",
+        default_inputs={"data": ["https://example.com/data.zip"]},
+    )
+    try:
+        for kwargs in ({"force_download": True}, {"revalidate": True}, {}):
+            with pytest.raises(ValueError):
+                valohai.inputs("data").stream(lazy=True, **kwargs)
+    finally:
+        global_state.flush_global_state()
@@ -64,3 +64,38 @@ def test_vfs(tmpdir):
         assert open_read_contents == expected_contents
 
     assert not any(os.path.isfile(name) for name in names_that_should_be_cleaned)
+
+
+def test_decompressed_copy_is_reused(tmpdir):
+    import gzip
+
+    from valohai.internals.vfs import DecompressedFile, FileOnDisk
+
+    compressed_path = tmpdir.join("data.jsonl.gz")
+    compressed_path.write_binary(gzip.compress(b"{}\n"))
+    file = DecompressedFile(FileOnDisk("data.jsonl.gz", str(compressed_path)))
+    assert file.name == "data.jsonl"
+
+    with file.open_concrete(delete=False) as f:
+        concrete_path = f.name
+        assert f.read() == b"{}\n"
+    inode = os.stat(concrete_path).st_ino
+    with file.open_concrete(delete=False) as f:
+        assert f.name == concrete_path
+    assert os.stat(concrete_path).st_ino == inode  # not decompressed again
+    mtime_ns = os.stat(concrete_path).st_mtime_ns
+
+    # Once the compressed file changes, so does the copy
+    compressed_path.write_binary(gzip.compress(b"[]\n"))
+    os.utime(str(compressed_path), ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    with file.open_concrete() as f:
+        assert f.read() == b"[]\n"
+    assert not os.path.exists(concrete_path)
+
+
+def test_download_state_is_not_listed(tmpdir):
+    tmpdir.join("data.bin").write("data")
+    tmpdir.mkdir(".valohai-download").join("data.bin.validators.json").write("{}")
+    with VFS() as vfs:
+        find_files(vfs, str(tmpdir), process_archives=False)
+        assert [file.name for file in vfs.files] == ["data.bin"]
@@ -3,6 +3,7 @@ __version__ = "0.7.0"
 import papi
 
 from valohai.controller_api import set_status_detail
+from valohai.downloads import downloads
 from valohai.inputs import inputs
 from valohai.internals.global_state import distributed
 from valohai.metadata import logger
@@ -17,6 +18,7 @@ Pipeline = papi.Papi
 
 __all__ = [
     "distributed",
+    "downloads",
     "execution",
     "inputs",
     "logger",
@@ -0,0 +1,44 @@
+"""Stats of the input files downloaded by this process."""
+
+from typing import Any, Dict, List
+
+from valohai.internals.download_stats import (
+    DownloadRecord,
+    clear_download_records,
+    get_download_records,
+    log_download_stats,
+    summarize,
+)
+
+
+class Downloads:
+    @property
+    def records(self) -> List[DownloadRecord]:
+        """
+        Get a record of each input file download (or cache hit) so far, in order of completion.
+
+        Returns:
+            List[DownloadRecord]: The URL, path, size, bytes downloaded, duration, time to
+                                  first byte, wait time, throughput, retries and cache hit
+                                  of each file.
+        """
+        return get_download_records()
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the totals of all the downloads so far."""
+        return summarize(get_download_records())
+
+    def log(self) -> None:
+        """Print the totals of all the downloads so far, and log them as Valohai metadata.
+
+        Set the `VH_LOG_DOWNLOAD_STATS` environment variable to `true` to have this done
+        automatically for each input once its files have been downloaded.
+        """
+        log_download_stats(get_download_records())
+
+    def clear(self) -> None:
+        """Forget the downloads so far."""
+        clear_download_records()
+
+
+downloads = Downloads()
@@ -1,8 +1,22 @@
-from typing import IO, Iterable, Iterator, List, Optional, Union
+import asyncio
+from typing import (
+    IO,
+    AsyncGenerator,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 
 from valohai.internals import vfs
 from valohai.internals.download_type import DownloadType
-from valohai.internals.inputs import get_input_vfs
+from valohai.internals.inputs import (
+    get_input_info,
+    iter_input_files,
+    iter_lazy_streams,
+)
 from valohai.paths import get_inputs_path
 
 
@@ -19,6 +33,8 @@ class Input:
         default: Optional[Iterable[str]] = None,
         process_archives: bool = True,
         force_download: bool = False,
+        revalidate: bool = False,
+        decompress: bool = False,
     ) -> Iterator[str]:
         """Get paths to all files for a given input name.
 
@@ -31,17 +47,18 @@ class Input:
         :param default: Default fallback paths.
         :param process_archives: When facing an archive file, is it unpacked to several paths or returned as is
         :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param decompress: Return paths to decompressed copies of compressed (.gz, .bz2, .xz, .zst) files
         :return: List of file system paths for all the files for this input.
         """
 
-        fs = get_input_vfs(
-            name=self.name,
+        files = self._iter_files(
+            path_filter=path_filter,
             process_archives=process_archives,
-            download_type=(
-                DownloadType.ALWAYS if force_download else DownloadType.OPTIONAL
-            ),
+            force_download=force_download,
+            revalidate=revalidate,
+            decompress=decompress,
         )
-        files = fs.filter(path_filter) if path_filter else fs.files
 
         found_file = False
         for file in files:
@@ -63,6 +80,8 @@ class Input:
         default: Optional[str] = None,
         process_archives: bool = True,
         force_download: bool = False,
+        revalidate: bool = False,
+        decompress: bool = False,
     ) -> Optional[str]:
         """Get path to a file for a given input name.
 
@@ -76,12 +95,16 @@ class Input:
         :param process_archives: When facing an archive file, is it unpacked or returned as is
         :param default: Default fallback path.
         :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param decompress: Return a path to a decompressed copy of a compressed (.gz, .bz2, .xz, .zst) file
         :return: File system path to a file for this input.
         """
         input_paths = self.paths(
             path_filter=path_filter,
             process_archives=process_archives,
             force_download=force_download,
+            revalidate=revalidate,
+            decompress=decompress,
         )
         return next(input_paths, default)
 
@@ -90,29 +113,47 @@ class Input:
         path_filter: Optional[str] = None,
         process_archives: bool = True,
         force_download: bool = False,
+        revalidate: bool = False,
+        lazy: bool = False,
+        decompress: bool = False,
     ) -> Iterator[IO[bytes]]:
         """Get file streams to all files for a given input name.
 
         Returns an Iterable for all the file IO streams for an input.
 
         If the file(s) are not found in the cache, they are downloaded automatically.
+        With `lazy=True`, they are not downloaded; instead, the returned seekable streams
+        read only the parts of the files that are actually accessed, using HTTP range requests.
+        Lazy mode can't unpack archives, decompress files or download them again, so
+        combining it with `force_download`, `revalidate` or `decompress`, or with
+        `process_archives` on an input that has archives, raises ValueError.
 
         See stream() or paths() for an alternative.
 
         :param path_filter: Filter the results with wildcards. For example: "myfile.txt" or "myfolder/*.txt".
         :param process_archives: When facing an archive file, is it unpacked or returned as is
         :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param lazy: Read remote files on demand instead of downloading them.
+        :param decompress: Stream the decompressed content of compressed (.gz, .bz2, .xz, .zst) files
         :return: Iterable for all the IO streams of files for this input.
         """
 
-        fs = get_input_vfs(
-            name=self.name,
+        if lazy:
+            if force_download or revalidate or decompress:
+                raise ValueError(
+                    "lazy=True can not be combined with force_download, revalidate or decompress"
+                )
+            yield from iter_lazy_streams(self.name, path_filter, process_archives)
+            return
+
+        files = self._iter_files(
+            path_filter=path_filter,
             process_archives=process_archives,
-            download_type=DownloadType.ALWAYS
-            if force_download
-            else DownloadType.OPTIONAL,
+            force_download=force_download,
+            revalidate=revalidate,
+            decompress=decompress,
         )
-        files = fs.filter(path_filter) if path_filter else fs.files
 
         for file in files:
             yield file.open()
@@ -122,18 +163,25 @@ class Input:
         path_filter: Optional[str] = None,
         process_archives: bool = True,
         force_download: bool = False,
+        revalidate: bool = False,
+        lazy: bool = False,
+        decompress: bool = False,
     ) -> Optional[IO[bytes]]:
         """Get a stream for to a file for a given input name.
 
         Returns an IO stream to a file for this input.
         If the input contains multiple files, only the stream to the first one is returned.
-        If the file(s) are not found in the cache, they are downloaded automatically.
+        If the file(s) are not found in the cache, they are downloaded automatically,
+        unless `lazy=True` (see streams() for what it can't be combined with).
 
         See path() or streams() for an alternative.
 
         :param path_filter: Filter the results with wildcards. For example: "myfile.txt" or "myfolder/*.txt".
         :param process_archives: When facing an archive file, is it unpacked or returned as is
         :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param lazy: Read remote files on demand instead of downloading them.
+        :param decompress: Stream the decompressed content of compressed (.gz, .bz2, .xz, .zst) files
         :return: IO stream to a file for this input.
         """
 
@@ -141,13 +189,202 @@ class Input:
             path_filter=path_filter,
             process_archives=process_archives,
             force_download=force_download,
+            revalidate=revalidate,
+            lazy=lazy,
+            decompress=decompress,
         )
         return next(streams, None)
 
+    async def apaths(
+        self,
+        path_filter: Optional[str] = None,
+        default: Optional[Iterable[str]] = None,
+        process_archives: bool = True,
+        force_download: bool = False,
+        revalidate: bool = False,
+        concurrency: Optional[int] = None,
+        decompress: bool = False,
+    ) -> AsyncIterator[str]:
+        """Asynchronous counterpart of paths().
+
+        Downloads run concurrently without blocking the event loop.
+
+        :param path_filter: Filter the results with wildcards. For example: "myfile.txt" or "myfolder/*.txt".
+        :param default: Default fallback paths.
+        :param process_archives: When facing an archive file, is it unpacked to several paths or returned as is
+        :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param concurrency: Maximum number of concurrent downloads (defaults to the download concurrency).
+        :param decompress: Decompress compressed (.gz, .bz2, .xz, .zst) files (see paths() and streams())
+        :return: Async iterator of file system paths for all the files for this input.
+        """
+        await self._adownload(
+            path_filter, process_archives, force_download, revalidate, concurrency
+        )
+        paths = await asyncio.to_thread(
+            lambda: list(
+                self.paths(
+                    path_filter=path_filter,
+                    default=default,
+                    process_archives=process_archives,
+                    decompress=decompress,
+                )
+            )
+        )
+        for path in paths:
+            yield path
+
+    async def apath(
+        self,
+        path_filter: Optional[str] = None,
+        default: Optional[str] = None,
+        process_archives: bool = True,
+        force_download: bool = False,
+        revalidate: bool = False,
+        concurrency: Optional[int] = None,
+        decompress: bool = False,
+    ) -> Optional[str]:
+        """Asynchronous counterpart of path().
+
+        :param path_filter: Filter the results with wildcards. For example: "myfile.txt" or "myfolder/*.txt".
+        :param default: Default fallback path.
+        :param process_archives: When facing an archive file, is it unpacked or returned as is
+        :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param concurrency: Maximum number of concurrent downloads (defaults to the download concurrency).
+        :param decompress: Decompress compressed (.gz, .bz2, .xz, .zst) files (see paths() and streams())
+        :return: File system path to a file for this input.
+        """
+        await self._adownload(
+            path_filter, process_archives, force_download, revalidate, concurrency
+        )
+        return await asyncio.to_thread(
+            self.path,
+            path_filter=path_filter,
+            default=default,
+            process_archives=process_archives,
+            decompress=decompress,
+        )
+
+    async def astreams(
+        self,
+        path_filter: Optional[str] = None,
+        process_archives: bool = True,
+        force_download: bool = False,
+        revalidate: bool = False,
+        concurrency: Optional[int] = None,
+        decompress: bool = False,
+    ) -> AsyncGenerator[IO[bytes], None]:
+        """Asynchronous counterpart of streams().
+
+        :param path_filter: Filter the results with wildcards. For example: "myfile.txt" or "myfolder/*.txt".
+        :param process_archives: When facing an archive file, is it unpacked or returned as is
+        :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param concurrency: Maximum number of concurrent downloads (defaults to the download concurrency).
+        :param decompress: Decompress compressed (.gz, .bz2, .xz, .zst) files (see paths() and streams())
+        :return: Async iterator for all the IO streams of files for this input.
+        """
+        await self._adownload(
+            path_filter, process_archives, force_download, revalidate, concurrency
+        )
+        files = await asyncio.to_thread(
+            lambda: list(
+                self._iter_files(
+                    path_filter=path_filter,
+                    process_archives=process_archives,
+                    force_download=False,
+                    decompress=decompress,
+                )
+            )
+        )
+        for file in files:
+            yield await asyncio.to_thread(file.open)
+
+    async def astream(
+        self,
+        path_filter: Optional[str] = None,
+        process_archives: bool = True,
+        force_download: bool = False,
+        revalidate: bool = False,
+        concurrency: Optional[int] = None,
+        decompress: bool = False,
+    ) -> Optional[IO[bytes]]:
+        """Asynchronous counterpart of stream().
+
+        :param path_filter: Filter the results with wildcards. For example: "myfile.txt" or "myfolder/*.txt".
+        :param process_archives: When facing an archive file, is it unpacked or returned as is
+        :param force_download: Force re-download of file(s) even when they are cached already.
+        :param revalidate: Download cached file(s) again only if they have changed since they were cached.
+        :param concurrency: Maximum number of concurrent downloads (defaults to the download concurrency).
+        :param decompress: Decompress compressed (.gz, .bz2, .xz, .zst) files (see paths() and streams())
+        :return: IO stream to a file for this input.
+        """
+        streams = self.astreams(
+            path_filter=path_filter,
+            process_archives=process_archives,
+            force_download=force_download,
+            revalidate=revalidate,
+            concurrency=concurrency,
+            decompress=decompress,
+        )
+        try:
+            async for stream in streams:
+                return stream
+            return None
+        finally:
+            # Clean up now rather than whenever the generator is garbage collected
+            # (contextlib.aclosing() needs Python 3.10)
+            await streams.aclose()
+
+    async def _adownload(
+        self,
+        path_filter: Optional[str],
+        process_archives: bool,
+        force_download: bool,
+        revalidate: bool,
+        concurrency: Optional[int],
+    ) -> None:
+        input_info = await asyncio.to_thread(get_input_info, self.name)
+        if input_info:
+            await input_info.adownload_if_necessary(
+                self.name,
+                _get_download_type(force_download, revalidate),
+                concurrency=concurrency,
+                path_filter=path_filter,
+                process_archives=process_archives,
+            )
+
+    def _iter_files(
+        self,
+        path_filter: Optional[str],
+        process_archives: bool,
+        force_download: bool,
+        revalidate: bool = False,
+        decompress: bool = False,
+    ) -> Iterator[vfs.File]:
+        files = iter_input_files(
+            vfs.VFS(),
+            name=self.name,
+            process_archives=process_archives,
+            download_type=_get_download_type(force_download, revalidate),
+            path_filter=path_filter,
+            decompress=decompress,
+        )
+        return vfs.filter_files(files, path_filter) if path_filter else files
+
     def dir_path(
         self,
     ) -> str:
         return get_inputs_path(self.name)
 
 
+def _get_download_type(force_download: bool, revalidate: bool) -> DownloadType:
+    if force_download:
+        return DownloadType.ALWAYS
+    if revalidate:
+        return DownloadType.REVALIDATE
+    return DownloadType.OPTIONAL
+
+
 inputs = Input
@@ -2,6 +2,7 @@ import json
 from typing import TYPE_CHECKING, Any, Dict
 
 from valohai import paths
+from valohai.internals.http_client import get_http_session
 
 if TYPE_CHECKING:
     import requests
@@ -34,14 +35,12 @@ def send_api_request(
     :param endpoint: The endpoint to send the request to.  Will be
                      looked up in the API JSON configuration file.
     :param requests_kwargs: Any keyword arguments to pass to the
-                            requests.request() function.  You can expect
+                            requests.Session.request() method.  You can expect
                             `url` and `method` and likely `headers` to
                             have been set for you.
     """
-    import requests
-
     requests_config = get_api_requests_kwargs(endpoint)
     requests_config.update(requests_kwargs)
-    resp = requests.request(**requests_config)
+    resp = get_http_session().request(**requests_config)
     resp.raise_for_status()
     return resp
@@ -0,0 +1,80 @@
+import hashlib
+from typing import Dict, Optional
+
+# Strongest first; only the strongest checksum available is verified.
+SUPPORTED_ALGORITHMS = ("sha256", "sha1", "md5")
+
+HASH_READ_CHUNK_SIZE = 1048576
+
+
+class ChecksumMismatch(RuntimeError):
+    pass
+
+
+def hash_file(path: str, algorithm: str) -> str:
+    """Get the hex digest of the contents of a file, read in chunks."""
+    file_hash = hashlib.new(algorithm)
+    _update_hash_from_file(file_hash, path)
+    return file_hash.hexdigest()
+
+
+def _update_hash_from_file(
+    file_hash: "hashlib._Hash", path: str, length: Optional[int] = None
+) -> None:
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk_size = HASH_READ_CHUNK_SIZE
+            if remaining is not None:
+                chunk_size = min(chunk_size, remaining)
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+class ChecksumVerifier:
+    """Incrementally hashes data to verify it against a known checksum.
+
+    Falsy when none of the given checksums is of a supported algorithm.
+    """
+
+    def __init__(self, checksums: Optional[Dict[str, str]]) -> None:
+        self.algorithm: Optional[str] = None
+        self.expected: Optional[str] = None
+        self._hash: Optional["hashlib._Hash"] = None
+        for algorithm in SUPPORTED_ALGORITHMS:
+            if checksums and checksums.get(algorithm):
+                self.algorithm = algorithm
+                self.expected = checksums[algorithm].lower()
+                self._hash = hashlib.new(algorithm)
+                break
+
+    def __bool__(self) -> bool:
+        return self._hash is not None
+
+    def update(self, data: bytes) -> None:
+        if self._hash is not None:
+            self._hash.update(data)
+
+    def update_from_file(self, path: str, length: Optional[int] = None) -> None:
+        """Hash the contents of a file, or its first `length` bytes."""
+        if self._hash is not None:
+            _update_hash_from_file(self._hash, path, length)
+
+    @property
+    def hexdigest(self) -> Optional[str]:
+        return self._hash.hexdigest() if self._hash is not None else None
+
+    def verify(self, description: str) -> None:
+        """Raise ChecksumMismatch if the data hashed so far doesn't match."""
+        if self._hash is None:
+            return
+        actual = self._hash.hexdigest()
+        if actual != self.expected:
+            raise ChecksumMismatch(
+                f"{self.algorithm} checksum mismatch for {description}: "
+                f"expected {self.expected}, got {actual}"
+            )
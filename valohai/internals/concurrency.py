@@ -0,0 +1,80 @@
+import os
+import sys
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+
+
+def get_download_concurrency() -> int:
+    """Get the maximum number of files to download concurrently.
+
+    The value given to `valohai.prepare()` wins over the `VH_DOWNLOAD_CONCURRENCY`
+    environment variable, which in turn wins over the default.
+    """
+    from valohai.internals import global_state
+
+    if global_state.download_concurrency:
+        return max(1, global_state.download_concurrency)
+    from_env = os.environ.get("VH_DOWNLOAD_CONCURRENCY")
+    if from_env:
+        try:
+            return max(1, int(from_env))
+        except ValueError:
+            print(  # noqa: T201
+                f"Warning: Ignoring invalid VH_DOWNLOAD_CONCURRENCY value {from_env!r}",
+                file=sys.stderr,
+            )
+    return DEFAULT_DOWNLOAD_CONCURRENCY
+
+
+def map_concurrently(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: Optional[int] = None,
+) -> List[R]:
+    """Call `func` for each item using a bounded thread pool.
+
+    Results are returned in the order of `items`.
+
+    On failure, items that have not started yet are cancelled, the ones already
+    running are allowed to finish, and the exception of the first failed item
+    (in the order of `items`, not in the order of completion) is re-raised.
+    Any further failures are reported on stderr.
+
+    :param func: Function to call for each item
+    :param items: Items to process
+    :param max_workers: Maximum number of concurrent calls; defaults to the download concurrency
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = get_download_concurrency()
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    futures: List["Future[R]"]
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items)),
+        thread_name_prefix="valohai-download",
+    ) as executor:
+        futures = [executor.submit(func, item) for item in items]
+        _, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+
+    errors = [
+        exc
+        for exc in (f.exception() for f in futures if not f.cancelled())
+        if exc is not None
+    ]
+    if errors:
+        for exc in errors[1:]:
+            print(  # noqa: T201
+                f"Warning: Another concurrent download also failed: {exc!r}",
+                file=sys.stderr,
+            )
+        raise errors[0]
+    return [f.result() for f in futures]
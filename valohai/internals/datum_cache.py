@@ -0,0 +1,123 @@
+"""A local, persistent cache of datum metadata, and of the local copies verified to match it.
+
+Datums are immutable, so their metadata (name, checksum, size) can be cached forever;
+aliases can be repointed, so their resolutions are only trusted for `VH_DATUM_ALIAS_TTL`
+seconds. The cache is a JSON file at `VH_DATUM_CACHE_PATH` (by default in `.valohai/`).
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from valohai.internals.utils import get_int_from_env
+
+DEFAULT_CACHE_PATH = ".valohai/datum-cache.json"
+DEFAULT_ALIAS_TTL = 3600
+
+_lock = threading.Lock()
+_data: Optional[Tuple[str, Dict[str, Dict[str, Any]]]] = None  # (path, data)
+
+
+def get_cache_path() -> str:
+    return os.environ.get("VH_DATUM_CACHE_PATH") or DEFAULT_CACHE_PATH
+
+
+def get_datum(datum_id_or_alias: str) -> Optional[Dict[str, Any]]:
+    """Get the cached metadata of a datum by its ID, or by an alias resolved recently enough."""
+    with _lock:
+        data = _get_data()
+        alias = data["aliases"].get(datum_id_or_alias)
+        if alias:
+            ttl = get_int_from_env("VH_DATUM_ALIAS_TTL", DEFAULT_ALIAS_TTL)
+            if alias["resolved_at"] + ttl < time.time():
+                return None
+            datum_id_or_alias = alias["id"]
+        return data["datums"].get(datum_id_or_alias)
+
+
+def store_datum(datum_id_or_alias: str, datum_obj: Dict[str, Any]) -> None:
+    datum_id = str(datum_obj["id"])
+    entry = {
+        key: datum_obj[key]
+        for key in ("id", "name", "sha256", "size")
+        if key in datum_obj
+    }
+    updates: Dict[str, Dict[str, Any]] = {"datums": {datum_id: entry}}
+    if datum_id_or_alias != datum_id:
+        updates["aliases"] = {
+            datum_id_or_alias: {"id": datum_id, "resolved_at": time.time()}
+        }
+    _update(updates)
+
+
+def is_verified_copy(datum_obj: Dict[str, Any], path: str) -> bool:
+    """Tell whether `path` is known to be an intact copy of the datum.
+
+    That is, if it was verified against the checksum of the datum earlier,
+    and hasn't been modified since.
+    """
+    with _lock:
+        verified = _get_data()["verified"].get(os.path.abspath(path))
+    return bool(verified) and verified == _get_file_state(datum_obj, path)
+
+
+def mark_verified_copy(datum_obj: Dict[str, Any], path: str) -> None:
+    """Remember that `path` has been verified to be an intact copy of the datum."""
+    state = _get_file_state(datum_obj, path)
+    if state:
+        _update({"verified": {os.path.abspath(path): state}})
+
+
+def _get_file_state(datum_obj: Dict[str, Any], path: str) -> Optional[Dict[str, Any]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {
+        "datum_id": datum_obj["id"],
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _get_data() -> Dict[str, Dict[str, Any]]:
+    global _data
+    path = get_cache_path()
+    if _data is None or _data[0] != path:
+        _data = (path, _load(path))
+    return _data[1]
+
+
+def _load(path: str) -> Dict[str, Dict[str, Any]]:
+    data: Dict[str, Dict[str, Any]] = {"datums": {}, "aliases": {}, "verified": {}}
+    with contextlib.suppress(OSError, ValueError):
+        with open(path) as f:
+            loaded = json.load(f)
+        for section in data:
+            if isinstance(loaded, dict) and isinstance(loaded.get(section), dict):
+                data[section] = loaded[section]
+    return data
+
+
+def _update(updates: Dict[str, Dict[str, Any]]) -> None:
+    global _data
+    with _lock:
+        # Merge with what other processes may have written meanwhile
+        path = get_cache_path()
+        data = _load(path)
+        for section, entries in updates.items():
+            data[section].update(entries)
+        _data = (path, data)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Not being able to cache is no reason to fail
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
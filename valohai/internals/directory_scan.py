@@ -0,0 +1,33 @@
+import os
+from typing import Dict, Optional
+
+
+class DirectoryScan:
+    """Looks up files by listing their directories with `os.scandir()`, once per directory.
+
+    Checking many files of the same directories against a scan, instead of calling
+    `os.stat()` for each, costs no system calls for the files that don't exist, and
+    none for the files that do, until their size is needed (on POSIX; on Windows, not
+    even then). The entries are cached, so repeated checks cost nothing more either.
+
+    A scan is a snapshot: files created after their directory was listed are not seen.
+    """
+
+    def __init__(self) -> None:
+        self._directories: Dict[str, Dict[str, "os.DirEntry[str]"]] = {}
+
+    def get_entry(self, path: str) -> Optional["os.DirEntry[str]"]:
+        """Get the directory entry of `path`, or None if there is no such file."""
+        directory, name = os.path.split(os.path.abspath(path))
+        entries = self._directories.get(directory)
+        if entries is None:
+            entries = self._directories[directory] = _list_directory(directory)
+        return entries.get(name)
+
+
+def _list_directory(directory: str) -> Dict[str, "os.DirEntry[str]"]:
+    try:
+        with os.scandir(directory) as it:
+            return {entry.name: entry for entry in it}
+    except OSError:  # e.g. it doesn't exist (yet)
+        return {}
@@ -1,12 +1,80 @@
 import contextlib
+import io
+import json
 import os
-import tempfile
-import shutil
-from typing import Any, Dict, Union
+import queue
+import random
+import sys
+import tarfile
+import threading
+import time
+from stat import S_ISREG
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from requests import Response
-from valohai.internals.utils import uri_to_filename, get_sha256_hash
+from requests.exceptions import ChunkedEncodingError, HTTPError, Timeout
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from valohai.internals.utils import (
+    file_uri_to_path,
+    get_float_from_env,
+    get_int_from_env,
+    uri_to_filename,
+    get_sha256_hash,
+    is_file_uri,
+    string_to_bool,
+)
 from valohai.internals.api_calls import send_api_request
+from valohai.internals.checksums import ChecksumMismatch, ChecksumVerifier
+from valohai.internals.concurrency import map_concurrently
+from valohai.internals.directory_scan import DirectoryScan
+from valohai.internals.download_locks import (
+    STATE_DIR_NAME,
+    download_slot,
+    get_state_path,
+    lock_file,
+)
+from valohai.internals.download_stats import DownloadRecorder
+from valohai.internals.http_client import get_http_session
+from valohai.internals import datum_cache, extraction, input_cache
+from valohai.internals.input_cache import get_input_cache_dir
+
+PART_SUFFIX = ".part"
+VALIDATORS_SUFFIX = ".validators.json"
+DOWNLOAD_CHUNK_SIZE = 1048576
+DEFAULT_SEGMENT_MIN_SIZE = 32 * 1048576
+DEFAULT_DOWNLOAD_ATTEMPTS = 6
+ORPHAN_MIN_AGE = 3600
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+DEFAULT_HEDGE_DELAY = 5.0
+HEDGE_POLL_INTERVAL = 0.1
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+EXPIRED_URL_STATUS_CODES = {400, 401, 403}
+
+# Called with a download URL that has expired; returns a fresh one
+UrlRefresher = Callable[[str], str]
+
+# Files verified by is_intact(): (path, size, mtime_ns, algorithm, checksum)
+_verified_files: Set[Tuple[str, int, int, Optional[str], Optional[str]]] = set()
+
+
+class IncompleteDownload(RuntimeError):
+    pass
+
+
+class DownloadCancelled(RuntimeError):
+    pass
 
 
 def resolve_datum(datum_id: str) -> Dict[str, Any]:
@@ -45,6 +113,21 @@ def resolve_datum(datum_id: str) -> Dict[str, Any]:
     return data
 
 
+def get_datum(datum_id_or_alias: str) -> Dict[str, Any]:
+    """Like resolve_datum(), but from the local datum cache when possible."""
+    datum_obj = datum_cache.get_datum(datum_id_or_alias)
+    if datum_obj is None:
+        datum_obj = resolve_datum(datum_id_or_alias)
+        datum_cache.store_datum(datum_id_or_alias, datum_obj)
+    return datum_obj
+
+
+def resolve_datums(datum_ids_or_aliases: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Get the metadata of many datums (by IDs or aliases), resolving them concurrently."""
+    datum_objs = map_concurrently(get_datum, datum_ids_or_aliases)
+    return dict(zip(datum_ids_or_aliases, datum_objs))
+
+
 def verify_datum(
     datum_obj: Dict[str, Any],
     input_folder_path: Union[str, None] = None,
@@ -72,65 +155,1145 @@ def verify_datum(
 
 
 # TODO: This is close to valohai-local-run. Possibility to merge.
-def download_url(url: str, path: str, force_download: bool = False) -> str:
-    if not os.path.isfile(path) or force_download:
-        if url.startswith("datum://"):
-            input_folder_path = os.path.dirname(path)
-            datum_id_or_alias = uri_to_filename(url)
-            datum_obj = resolve_datum(datum_id_or_alias)
-            filename = datum_obj["name"]
-            file_path = os.path.join(input_folder_path, filename)
-
-            # it's safe to import valohai_cli, because resolve_datum bails out if it is not available
-            from valohai_cli.api import request
-
-            download_response = request(
-                url=f"/api/v0/data/{datum_obj['id']}/download/", method="GET"
+def download_url(
+    url: str,
+    path: str,
+    force_download: bool = False,
+    checksums: Optional[Dict[str, str]] = None,
+    cache_key: Optional[str] = None,
+    refresh_url: Optional[UrlRefresher] = None,
+    revalidate: bool = False,
+    mirrors: Optional[List[str]] = None,
+) -> str:
+    """Download `url` into `path`, unless it is there already.
+
+    Failed downloads are retried with exponential backoff (see `_download_with_retries`).
+    If the URL is a presigned one that may expire, `refresh_url` should be given
+    to get a fresh one when the server starts refusing the old one.
+    With `revalidate`, a file that is there already is downloaded again only if
+    the server reports that it has changed since (see `is_unchanged`).
+    If the file is also available from `mirrors`, they are raced against `url`
+    when the download from it is slow (see `_HedgedDownload`).
+    """
+    recorder = DownloadRecorder(url, path)
+    if os.path.isfile(path) and not force_download:
+        if not revalidate or is_unchanged(url, path):
+            print(f"Using cached {path}")  # noqa
+            recorder.finish(cache_hit=True)
+            return path
+        force_download = True
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Only one process on the host downloads a given file; the others wait for it
+    with lock_file(path) as waited:
+        if os.path.isfile(path) and (waited or not force_download):
+            print(f"Using {path} downloaded by another process")  # noqa
+            recorder.finish(cache_hit=True)
+            return path
+        return _download_locked(
+            url,
+            path,
+            force_download,
+            checksums,
+            cache_key,
+            refresh_url,
+            recorder,
+            mirrors,
+        )
+
+
+def download_and_extract(
+    url: str,
+    path: str,
+    force_download: bool = False,
+    checksums: Optional[Dict[str, str]] = None,
+    refresh_url: Optional[UrlRefresher] = None,
+) -> str:
+    """Download the tar archive at `url`, unpacking it instead of saving it at `path`.
+
+    Unless it has been extracted there already (see `extraction`). Failed downloads are
+    retried as by `download_url`, but the extraction starts over instead of resuming.
+    Returns `path`, though there is no file there; the VFS finds the members instead.
+    """
+    recorder = DownloadRecorder(url, path)
+    if extraction.read_manifest(path) is not None and not force_download:
+        print(f"Using {path} extracted earlier")  # noqa
+        recorder.finish(cache_hit=True)
+        return path
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with lock_file(path) as waited:
+        if waited and extraction.read_manifest(path) is not None:
+            print(f"Using {path} extracted by another process")  # noqa
+            recorder.finish(cache_hit=True)
+            return path
+        try:
+            extraction.remove_extracted(path)
+            _download_with_retries(
+                url,
+                path,
+                checksums,
+                refresh_url=refresh_url,
+                recorder=recorder,
+                fetch=_do_extract,
             )
-            download_response.raise_for_status()
-            _do_download(download_response.json()["url"], file_path)
+        except Exception as exc:
+            recorder.finish(error=exc)
+            raise
+        # A copy of the archive downloaded earlier would be used instead of the members
+        _remove_download(path)
+    recorder.finish(path)
+    return path
+
+
+def _download_locked(
+    url: str,
+    path: str,
+    force_download: bool,
+    checksums: Optional[Dict[str, str]],
+    cache_key: Optional[str],
+    refresh_url: Optional[UrlRefresher],
+    recorder: DownloadRecorder,
+    mirrors: Optional[List[str]] = None,
+) -> str:
+    if url.startswith("datum://"):
+        return _download_datum(url, path, force_download, recorder)
+    if is_file_uri(url):
+        return _link_local_file(url, path, recorder)
+
+    cache_dir = get_input_cache_dir() if cache_key else None
+    if (
+        cache_dir
+        and cache_key
+        and not force_download
+        and input_cache.materialize(cache_dir, cache_key, path)
+    ):
+        print(f"Using cached {path} from {cache_dir}")  # noqa
+        recorder.finish(cache_hit=True)
+        return path
 
-            path = verify_datum(datum_obj, file_path=file_path)
+    try:
+        if mirrors:
+            _HedgedDownload([url, *mirrors], path, checksums, refresh_url).run(recorder)
         else:
-            _do_download(url, path)
-    else:
-        print(f"Using cached {path}")  # noqa
+            _download_with_retries(
+                url, path, checksums, refresh_url=refresh_url, recorder=recorder
+            )
+    except Exception as exc:
+        recorder.finish(error=exc)
+        raise
+    recorder.finish(path)
+    if cache_dir and cache_key:
+        input_cache.store(cache_dir, cache_key, path)
+    return path
+
+
+def _download_datum(
+    url: str, path: str, force_download: bool, recorder: DownloadRecorder
+) -> str:
+    """Download a datum into the directory of `path`, under the name of the datum.
 
+    A local copy that has been verified to match the datum is used as is.
+    """
+    try:
+        datum_obj = get_datum(uri_to_filename(url))
+        file_path = os.path.join(os.path.dirname(path), datum_obj["name"])
+        if not force_download and _has_verified_copy(datum_obj, file_path):
+            print(f"Using cached {file_path}")  # noqa
+            recorder.finish(file_path, cache_hit=True)
+            return file_path
+        _download_datum_file(datum_obj, file_path, recorder)
+    except Exception as exc:
+        recorder.finish(error=exc)
+        raise
+    datum_cache.mark_verified_copy(datum_obj, file_path)
+    recorder.finish(file_path)
+    return file_path
+
+
+def _link_local_file(url: str, path: str, recorder: DownloadRecorder) -> str:
+    """Make the file a `file://` URL points at available at `path`, without copying it.
+
+    The file is hardlinked, or if it is on another filesystem (e.g. a shared NFS mount),
+    symlinked. With `VH_COPY_LOCAL_INPUTS=true`, it is copied instead, as cheaply as
+    the filesystem allows (see `input_cache.copy_file`).
+    """
+    try:
+        source = file_uri_to_path(url)
+        if not os.path.isfile(source):
+            raise FileNotFoundError(f"No such file: {source}")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        if string_to_bool(os.environ.get("VH_COPY_LOCAL_INPUTS", "false")):
+            input_cache.copy_file(source, path)
+        else:
+            try:
+                os.link(source, path)
+            except OSError:
+                os.symlink(os.path.abspath(source), path)
+    except Exception as exc:
+        recorder.finish(error=exc)
+        raise
+    print(f"Using {source} as {path}")  # noqa
+    recorder.finish(path)
     return path
 
 
-def _do_download(url: str, path: str) -> None:
+def _has_verified_copy(datum_obj: Dict[str, Any], file_path: str) -> bool:
+    if datum_cache.is_verified_copy(datum_obj, file_path):
+        return True
+    if os.path.isfile(file_path) and get_sha256_hash(file_path) == datum_obj["sha256"]:
+        datum_cache.mark_verified_copy(datum_obj, file_path)
+        return True
+    return False
+
+
+def _download_datum_file(
+    datum_obj: Dict[str, Any], file_path: str, recorder: DownloadRecorder
+) -> None:
     try:
-        import requests
+        from valohai_cli.api import request
+    except ImportError as ie:
+        raise RuntimeError("Can't download datum without valohai-cli") from ie
+
+    def get_download_url(expired_url: Optional[str] = None) -> str:
+        download_response = request(
+            url=f"/api/v0/data/{datum_obj['id']}/download/", method="GET"
+        )
+        download_response.raise_for_status()
+        return str(download_response.json()["url"])
+
+    # The datum checksum is verified while downloading
+    _download_with_retries(
+        get_download_url(),
+        file_path,
+        checksums={"sha256": datum_obj["sha256"]},
+        refresh_url=get_download_url,
+        recorder=recorder,
+    )
+
+
+def _download_with_retries(
+    url: str,
+    path: str,
+    checksums: Optional[Dict[str, str]] = None,
+    refresh_url: Optional[UrlRefresher] = None,
+    recorder: Optional[DownloadRecorder] = None,
+    cancel: Optional[threading.Event] = None,
+    fetch: Optional[Callable[..., None]] = None,
+    take_slot: bool = True,
+) -> None:
+    """Download `url` into `path`, retrying transient failures.
+
+    Connection errors, incomplete responses and 408/429/5xx responses are retried up to
+    `VH_DOWNLOAD_ATTEMPTS` attempts in total, with exponential backoff and full jitter
+    between them (or as long as a `Retry-After` header asks for).
+    When the server refuses the URL (400/401/403, as presigned URLs do once they expire)
+    and `refresh_url` is given, the download is retried right away with a fresh URL.
+    Each retry resumes from what the previous attempts already received.
+    Setting the `cancel` event stops the download with DownloadCancelled.
+    Each attempt is made with `fetch` (by default, `_do_download`), within a host-wide
+    download slot (see `download_slot`), unless `take_slot` is False as the caller
+    holds one already.
+    """
+    fetch = fetch or _do_download
+    attempts = get_int_from_env("VH_DOWNLOAD_ATTEMPTS", DEFAULT_DOWNLOAD_ATTEMPTS)
+    for attempt in range(1, attempts + 1):
+        try:
+            with download_slot() if take_slot else contextlib.nullcontext():
+                fetch(url, path, checksums, recorder, cancel)
+            return
+        except Exception as exc:
+            url_expired = _is_url_expired(exc)
+            if attempt == attempts or not (
+                _is_transient_error(exc) or (url_expired and refresh_url)
+            ):
+                raise
+            if recorder:
+                recorder.retries += 1
+            if url_expired and refresh_url:
+                print(  # noqa: T201
+                    f"Download URL of {path} was refused ({exc}); retrying with a fresh one",
+                    file=sys.stderr,
+                )
+                url = refresh_url(url)
+                continue
+            delay = _get_retry_delay(exc, attempt)
+            print(  # noqa: T201
+                f"Download of {path} failed ({exc}); retrying in {delay:.1f} seconds "
+                f"(attempt {attempt + 1}/{attempts})",
+                file=sys.stderr,
+            )
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                raise DownloadCancelled(f"Download of {path} was cancelled") from exc
+
+
+def _is_transient_error(exc: Exception) -> bool:
+    if isinstance(exc, HTTPError):
+        return exc.response is not None and (
+            exc.response.status_code in RETRYABLE_STATUS_CODES
+        )
+    if isinstance(exc, IncompleteDownload):
+        return True
+    return isinstance(exc, (RequestsConnectionError, Timeout, ChunkedEncodingError))
+
+
+def _is_url_expired(exc: Exception) -> bool:
+    return (
+        isinstance(exc, HTTPError)
+        and exc.response is not None
+        and exc.response.status_code in EXPIRED_URL_STATUS_CODES
+    )
+
+
+def _get_retry_delay(exc: Exception, attempt: int) -> float:
+    if isinstance(exc, HTTPError) and exc.response is not None:
+        retry_after = exc.response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), RETRY_MAX_DELAY)
+    return random.uniform(
+        0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    )
+
+
+class _Contender:
+    """One of the concurrent downloads of a hedged download."""
+
+    def __init__(self, url: str, path: str) -> None:
+        self.url = url
+        self.path = path
+        self.recorder = DownloadRecorder(url, path)
+        self.cancel = threading.Event()
+        self.finished = False
+        self.error: Optional[Exception] = None
+
+    def is_slow(self, delay: float, min_throughput: int) -> bool:
+        """Tell whether the response is taking longer than `delay` to start, or the
+        data has been arriving slower than `min_throughput` bytes per second since.
+
+        Until the request has been sent (e.g. while backing off between attempts),
+        it isn't counted as slow.
+        """
+        recorder = self.recorder
+        if recorder.request_at is None:
+            return False
+        if recorder.response_at is None:
+            return time.monotonic() - recorder.request_at > delay
+        transfer_time = time.monotonic() - recorder.response_at
+        return bool(
+            min_throughput
+            and transfer_time > delay
+            and self.recorder.bytes_downloaded / transfer_time < min_throughput
+        )
+
+
+class _HedgedDownload:
+    """Downloads a file from the first of `urls`, racing the others (mirrors) against it.
+
+    Another URL is tried when none of the downloads in progress has received a response
+    within `VH_DOWNLOAD_HEDGE_DELAY` seconds (default 5), when they are receiving less
+    than `VH_DOWNLOAD_HEDGE_MIN_THROUGHPUT` bytes per second (if set), or when they
+    have all failed. The primary URL is downloaded into place, resuming an earlier
+    partial download of the file if there is one; each mirror goes into a file of its
+    own, which is moved into place if it finishes first. The others are then cancelled.
+
+    The whole race runs within one host-wide download slot (see `download_slot`),
+    so that the mirrors don't queue for a slot behind the primary's own.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        path: str,
+        checksums: Optional[Dict[str, str]],
+        refresh_url: Optional[UrlRefresher],
+    ) -> None:
+        self.urls = urls
+        self.path = path
+        self.checksums = checksums
+        self.refresh_url = refresh_url
+        self.contenders: List[_Contender] = []
+        self.winner: Optional[_Contender] = None
+        self._lock = threading.Lock()
+        self._finished: "queue.Queue[_Contender]" = queue.Queue()
+
+    def run(self, recorder: DownloadRecorder) -> None:
+        delay = get_float_from_env("VH_DOWNLOAD_HEDGE_DELAY", DEFAULT_HEDGE_DELAY)
+        min_throughput = get_int_from_env("VH_DOWNLOAD_HEDGE_MIN_THROUGHPUT", 0)
+        with download_slot():
+            self._race(recorder, delay, min_throughput)
+
+    def _race(
+        self, recorder: DownloadRecorder, delay: float, min_throughput: int
+    ) -> None:
+        self._start_next()
+        try:
+            while self.winner is None:
+                with contextlib.suppress(queue.Empty):
+                    self._finished.get(timeout=HEDGE_POLL_INTERVAL)
+                running = [c for c in self.contenders if not c.finished]
+                if self.winner is not None:
+                    break
+                if len(self.contenders) < len(self.urls):
+                    if all(c.is_slow(delay, min_throughput) for c in running):
+                        self._start_next()
+                elif not running:  # They all failed
+                    raise next(c.error for c in self.contenders if c.error)
+        finally:
+            for contender in self.contenders:
+                contender.cancel.set()
+                recorder.add_attempt(contender.recorder)
+
+    def _start_next(self) -> None:
+        index = len(self.contenders)
+        path = get_state_path(self.path, f".mirror{index}") if index else self.path
+        contender = _Contender(self.urls[index], path)
+        if index:
+            print(  # noqa: T201
+                f"Trying mirror {contender.url} for {self.path}",
+                file=sys.stderr,
+            )
+        self.contenders.append(contender)
+        threading.Thread(target=self._download, args=(contender,), daemon=True).start()
+
+    def _download(self, contender: _Contender) -> None:
+        try:
+            _download_with_retries(
+                contender.url,
+                contender.path,
+                self.checksums,
+                # Only the primary URL is one that the refresher knows how to refresh
+                refresh_url=self.refresh_url
+                if contender is self.contenders[0]
+                else None,
+                recorder=contender.recorder,
+                cancel=contender.cancel,
+                take_slot=False,
+            )
+        except Exception as exc:
+            if contender.cancel.is_set():
+                _discard_partial_download(get_state_path(contender.path, PART_SUFFIX))
+            else:
+                contender.error = exc
+        else:
+            with self._lock:
+                if self.winner is None:
+                    if contender.path != self.path:
+                        _move_download(contender.path, self.path)
+                    self.winner = contender
+                elif contender.path != self.path:
+                    _remove_download(contender.path)
+                # else the primary finished as it was being cancelled, with the same file
+        finally:
+            contender.finished = True
+            self._finished.put(contender)
+
+
+def _move_download(src: str, dst: str) -> None:
+    """Move a downloaded file, along with its validators, into place."""
+    os.replace(src, dst)
+    with contextlib.suppress(FileNotFoundError):
+        os.replace(_get_validators_path(src), _get_validators_path(dst, create=True))
+
+
+def _remove_download(path: str) -> None:
+    for leftover in (path, _get_validators_path(path)):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(leftover)
+
+
+def _do_download(
+    url: str,
+    path: str,
+    checksums: Optional[Dict[str, str]] = None,
+    recorder: Optional[DownloadRecorder] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
+    """Download `url` into `path`, resuming an earlier partial download if possible.
+
+    Data is written into a `.part` file next to the target. If a previous attempt was
+    interrupted, the download is resumed with a `Range` request, as long as the server
+    reports the same object (ETag or Last-Modified, and total size) as before.
+    The file is moved into place only once it has been received in full.
+
+    If `checksums` are given, the data is hashed as it is received, and the download
+    fails with `ChecksumMismatch` (leaving nothing behind) if it doesn't match.
+    """
+    try:
+        import requests  # noqa: F401
     except ImportError as ie:
         raise RuntimeError(
             f"The `requests` module must be available for download support (attempting to download {url})"
         ) from ie
 
-    tmp_path = tempfile.NamedTemporaryFile().name  # noqa (TODO: fix)
-    print(f"Downloading {url} -> {path}")  # noqa
-    r = requests.get(url, stream=True)
-    r.raise_for_status()
-    total = int(r.headers["content-length"]) if "content-length" in r.headers else None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    part_path = get_state_path(path, PART_SUFFIX, create=True)
+    part_state = _read_part_state(part_path)
+    offset = os.path.getsize(part_path) if part_state else 0
+
+    if part_state and offset:
+        print(f"Resuming download of {url} -> {path} at byte {offset}")  # noqa
+    else:
+        print(f"Downloading {url} -> {path}")  # noqa
+
+    headers = _get_resume_headers(part_state, offset)
+    if recorder:
+        recorder.request_sent()
+    with get_http_session().get(url, stream=True, headers=headers) as r:
+        if recorder:
+            recorder.response_received()
+        resume_offset = _get_resume_offset(r, part_state, offset)
+        if resume_offset is not None:
+            identity, verifier = _receive_download(
+                url, r, part_path, resume_offset, checksums, recorder, cancel
+            )
+    if resume_offset is None:
+        # The partial file is no good for this object; start over, once this response
+        # is closed, and within the download slot (if any) already held by the caller.
+        _discard_partial_download(part_path)
+        _do_download(url, path, checksums, recorder, cancel)
+        return
+    _finish_download(url, path, part_path, identity, verifier)
+
+
+def _receive_download(
+    url: str,
+    r: Response,
+    part_path: str,
+    resume_offset: int,
+    checksums: Optional[Dict[str, str]],
+    recorder: Optional[DownloadRecorder],
+    cancel: Optional[threading.Event],
+) -> Tuple[Dict[str, Any], ChecksumVerifier]:
+    """Write the body of `r` into the part file at `resume_offset`, hashing it on the way."""
+    identity = _get_object_identity(r)
+    if identity["etag"] or identity["last_modified"]:
+        _write_part_state(part_path, identity)
+    else:
+        # Without a validator we could never tell it's the same object; don't try.
+        _remove_part_state(part_path)
+
+    total = identity["size"]
+    verifier = ChecksumVerifier(checksums)
+    segments = _get_segment_count(r, identity, resume_offset)
+    with _progress_bar(total, resume_offset, recorder, cancel) as prog:
+        if segments > 1:
+            _download_segments(url, r, part_path, identity, segments, prog)
+            # Segments arrive out of order, so they can only be hashed afterwards
+            verifier.update_from_file(part_path)
+        else:
+            if resume_offset:
+                verifier.update_from_file(part_path, resume_offset)
+            _download_stream(r, part_path, identity, resume_offset, prog, verifier)
+    return identity, verifier
+
+
+def _do_extract(
+    url: str,
+    path: str,
+    checksums: Optional[Dict[str, str]] = None,
+    recorder: Optional[DownloadRecorder] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
+    """Download the tar archive at `url`, unpacking it for `path` as it is received.
+
+    If `checksums` are given, the archive is hashed as it is received. If it doesn't
+    match, or the download is cut short, whatever was extracted is removed.
+    """
+    print(  # noqa
+        f"Downloading and extracting {url} -> {extraction.get_extraction_dir(path)}"
+    )
+    if recorder:
+        recorder.request_sent()
+    with get_http_session().get(url, stream=True) as r:
+        if recorder:
+            recorder.response_received()
+        r.raise_for_status()
+        identity = _get_object_identity(r)
+        verifier = ChecksumVerifier(checksums)
+        with _progress_bar(identity["size"], 0, recorder, cancel) as prog:
+            reader = _ResponseReader(r, prog, verifier)
+            stream = io.BufferedReader(reader, DOWNLOAD_CHUNK_SIZE)
+            try:
+                members = extraction.extract_tar_stream(stream, path)
+            except tarfile.ReadError as exc:
+                if reader.is_incomplete(identity["size"]):
+                    raise IncompleteDownload(
+                        f"Download of {url} was incomplete ({reader.received} of {identity['size']} bytes received)"
+                    ) from exc
+                raise
+            try:
+                # Read whatever follows the end of the archive, to hash it too
+                while stream.read(DOWNLOAD_CHUNK_SIZE):
+                    pass
+                verifier.verify(url)
+            except BaseException:
+                extraction.remove_extracted(path)
+                raise
+    extraction.write_manifest(path, members, identity)
+
+
+class _ResponseReader(io.RawIOBase):
+    """A file-like view of the body of a response, for reading it as it is received."""
+
+    def __init__(
+        self, response: Response, prog: "_Progress", verifier: ChecksumVerifier
+    ) -> None:
+        super().__init__()
+        self.received = 0
+        self._chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+        self._pending = memoryview(b"")
+        self._prog = prog
+        self._verifier = verifier
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if not self._pending:
+            chunk = next(self._chunks, b"")
+            self.received += len(chunk)
+            self._prog.update(len(chunk))
+            self._verifier.update(chunk)
+            self._pending = memoryview(chunk)
+        view = memoryview(buffer).cast("B")
+        count = min(len(view), len(self._pending))
+        view[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def is_incomplete(self, size: Optional[int]) -> bool:
+        return size is not None and self.received < size
+
+
+def _finish_download(
+    url: str,
+    path: str,
+    part_path: str,
+    identity: Dict[str, Any],
+    verifier: ChecksumVerifier,
+) -> None:
+    """Check that the part file is complete and intact, and move it into place.
+
+    The validators of the object are stored next to it, for revalidating it later,
+    along with the verified checksum (see `is_intact`).
+    """
+    total = identity["size"]
+    received = os.path.getsize(part_path)
+    if total is not None and received != total:
+        if received > total:
+            _discard_partial_download(part_path)
+        raise IncompleteDownload(
+            f"Download of {url} was incomplete ({received} of {total} bytes received)"
+        )
     try:
-        from tqdm import tqdm
+        verifier.verify(url)
+    except ChecksumMismatch:
+        _discard_partial_download(part_path)
+        raise
+    _fsync(part_path)
+    os.replace(part_path, path)
+    _write_validators(path, identity, verifier)
+    _fsync(os.path.dirname(path) or ".")
+    _remove_part_state(part_path)
+
+
+def _download_stream(
+    response: Response,
+    part_path: str,
+    identity: Dict[str, Any],
+    offset: int,
+    prog: Optional["_Progress"],
+    verifier: ChecksumVerifier,
+) -> None:
+    """Write the body of `response` into the part file, starting at `offset`.
+
+    The part file is preallocated to the size of the whole object, so the filesystem
+    can lay it out in one go, and truncated back to the data actually received once
+    done or interrupted; its size thus always tells how far the download got.
+    """
+    size = identity["size"]
+    resumable = bool(identity["etag"] or identity["last_modified"])
+    with open(part_path, "r+b" if offset else "wb") as f:
+        f.seek(offset)
+        preallocated = size is not None and size > offset and _preallocate(f, size)
+        if preallocated and resumable:
+            # Until truncated, the size of the file means nothing; see _read_part_state()
+            _write_part_state(part_path, {**identity, "preallocated": True})
+        try:
+            _write_response(response, f, None, prog, verifier)
+        finally:
+            if preallocated:
+                f.truncate()
+                if resumable:
+                    _write_part_state(part_path, identity)
 
-        prog = tqdm(total=total, unit="iB", unit_scale=True)
+
+def _preallocate(f: IO[bytes], size: int) -> bool:
+    """Reserve disk space for `size` bytes of `f`, if the platform and filesystem allow."""
+    if not hasattr(os, "posix_fallocate"):
+        return False
+    if not string_to_bool(os.environ.get("VH_DOWNLOAD_PREALLOCATE", "true")):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError:
+        return False
+    return True
+
+
+def _fsync(path: str) -> None:
+    """Flush a file (or a directory entry) to disk, where the platform supports it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # e.g. directories on Windows
+        return
+    try:
+        with contextlib.suppress(OSError):
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def cleanup_partial_downloads(directory: str) -> None:
+    """Remove the leftovers of earlier downloads into `directory` that can't be resumed.
+
+    Partial downloads that can still be resumed are kept, and so is anything modified
+    within the last `ORPHAN_MIN_AGE` seconds, as it may belong to a download in progress
+    in another process.
+
+    Only the state directory of `directory` itself is looked at (see `get_state_path`),
+    so this stays cheap for large inputs; leftovers in subdirectories are resumed or
+    discarded when their files are downloaded again (see `_do_download`).
+    """
+    threshold = time.time() - ORPHAN_MIN_AGE
+    try:
+        entries = list(os.scandir(os.path.join(directory, STATE_DIR_NAME)))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.endswith(PART_SUFFIX):
+            part_path = entry.path
+            target_path = os.path.join(directory, entry.name[: -len(PART_SUFFIX)])
+            orphaned = (
+                os.path.exists(target_path) or _read_part_state(part_path) is None
+            )
+        elif entry.name.endswith(f"{PART_SUFFIX}.json"):
+            part_path = entry.path[: -len(".json")]
+            orphaned = not os.path.exists(part_path)
+        else:
+            continue
+        with contextlib.suppress(OSError):
+            if orphaned and entry.is_file() and entry.stat().st_mtime < threshold:
+                print(f"Removing stale partial download {entry.path}")  # noqa
+                _discard_partial_download(part_path)
+
+
+def _get_resume_headers(
+    part_state: Optional[Dict[str, Any]], offset: int
+) -> Dict[str, str]:
+    if not (part_state and offset):
+        return {}
+    headers = {"Range": f"bytes={offset}-"}
+    validator = part_state.get("etag") or part_state.get("last_modified")
+    if validator and not validator.startswith("W/"):
+        # Have the server send the whole object instead if it has changed
+        headers["If-Range"] = validator
+    return headers
+
+
+def _get_resume_offset(
+    response: Response, part_state: Optional[Dict[str, Any]], offset: int
+) -> Optional[int]:
+    """Figure out where the body of `response` goes in the partial file.
+
+    Returns None if the partial file is of no use and the download must start over.
+    Raises for any error responses.
+    """
+    if offset and response.status_code == 416:
+        return None
+    response.raise_for_status()
+    if not offset:
+        return 0
+    identity = _get_object_identity(response)
+    if _is_resumable_response(response, part_state, identity, offset):
+        return offset
+    if response.status_code == 206:
+        # We got a range of a different object
+        return None
+    # The server sent the whole object
+    return 0
+
+
+class _Progress:
+    """Reports the progress of a download to a progress bar and the download stats.
+
+    Also where a download is stopped, once its `cancel` event is set.
+    """
+
+    def __init__(
+        self,
+        bar: Optional[Any],
+        recorder: Optional[DownloadRecorder],
+        cancel: Optional[threading.Event] = None,
+    ) -> None:
+        self.bar = bar
+        self.recorder = recorder
+        self.cancel = cancel
+
+    def update(self, count: int) -> None:
+        if self.bar is not None:
+            self.bar.update(count)
+        if self.recorder:
+            self.recorder.add_bytes(count)
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled("Download was cancelled")
+
+
+@contextlib.contextmanager
+def _progress_bar(
+    total: Optional[int],
+    initial: int,
+    recorder: Optional[DownloadRecorder] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[_Progress]:
+    try:
+        from tqdm import tqdm
     except ImportError:
-        prog = contextlib.nullcontext()  # type: ignore
+        yield _Progress(None, recorder, cancel)
+        return
+    with tqdm(total=total, initial=initial, unit="iB", unit_scale=True) as bar:
+        yield _Progress(bar, recorder, cancel)
+
+
+def _write_response(
+    response: Response,
+    f: IO[bytes],
+    length: Optional[int],
+    prog: Optional[_Progress],
+    verifier: Optional[ChecksumVerifier] = None,
+) -> int:
+    """Write the body of `response` into `f`, stopping after `length` bytes if given.
+
+    Returns the number of bytes written.
+    """
+    written = 0
+    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+        if length is not None:
+            chunk = chunk[: length - written]
+        f.write(chunk)
+        if verifier:
+            verifier.update(chunk)
+        written += len(chunk)
+        if prog:
+            prog.update(len(chunk))
+        if length is not None and written >= length:
+            break
+    return written
+
+
+def _get_segment_count(
+    response: Response, identity: Dict[str, Any], offset: int
+) -> int:
+    """Decide how many concurrent range requests to split a download into.
+
+    Segmented downloads are enabled with the `VH_DOWNLOAD_SEGMENTS` environment
+    variable, and are only used for fresh downloads of objects that the server
+    allows fetching by range, and that are large enough for each segment to be at
+    least `VH_DOWNLOAD_SEGMENT_MIN_SIZE` bytes.
+    """
+    max_segments = get_int_from_env("VH_DOWNLOAD_SEGMENTS", 1)
+    size: Optional[int] = identity["size"]
+    if max_segments <= 1 or offset or not size:
+        return 1
+    if response.headers.get("accept-ranges", "").lower() != "bytes":
+        return 1
+    if not (identity["etag"] or identity["last_modified"]):
+        # We couldn't tell whether the segments are of the same object
+        return 1
+    min_segment_size = get_int_from_env(
+        "VH_DOWNLOAD_SEGMENT_MIN_SIZE", DEFAULT_SEGMENT_MIN_SIZE
+    )
+    return max(1, min(max_segments, size // min_segment_size))
 
-    with prog as prog, open(tmp_path, "wb") as f:
-        for chunk in r.iter_content(1048576):
-            if prog:
-                prog.update(len(chunk))
-            f.write(chunk)
+
+def _download_segments(
+    url: str,
+    response: Response,
+    part_path: str,
+    identity: Dict[str, Any],
+    segments: int,
+    prog: Optional[_Progress],
+) -> None:
+    """Download an object into a preallocated part file with concurrent range requests.
+
+    The first segment is read from the already open `response`;
+    the rest are fetched with range requests of their own.
+    """
+    size = identity["size"]
+    segment_size = -(-size // segments)  # ceiling division
+    bounds = [
+        (start, min(start + segment_size, size) - 1)
+        for start in range(0, size, segment_size)
+    ]
+    # The size of a preallocated part file tells nothing about its progress,
+    # so segmented downloads are never resumed.
+    _remove_part_state(part_path)
+    with open(part_path, "wb") as f:
+        if not _preallocate(f, size):
+            f.truncate(size)
+
+    prog_lock = threading.Lock()
+
+    def fetch_segment(index_and_bounds: Tuple[int, Tuple[int, int]]) -> None:
+        index, (start, end) = index_and_bounds
+        length = end - start + 1
+        with open(part_path, "r+b") as f:
+            f.seek(start)
+            if index == 0:
+                written = _write_response(response, f, length, None)
+            else:
+                written = _fetch_range(url, identity, start, end, f)
+        if written != length:
+            raise IncompleteDownload(
+                f"Download of {url} was incomplete (segment {start}-{end} got {written} of {length} bytes)"
+            )
+        if prog:
+            with prog_lock:
+                prog.update(length)
+
+    map_concurrently(fetch_segment, enumerate(bounds), max_workers=segments)
+
+
+def _fetch_range(
+    url: str, identity: Dict[str, Any], start: int, end: int, f: IO[bytes]
+) -> int:
+    headers = {"Range": f"bytes={start}-{end}"}
+    with get_http_session().get(url, stream=True, headers=headers) as r:
+        r.raise_for_status()
+        if not (
+            r.status_code == 206
+            and r.headers.get("content-range", "").startswith(f"bytes {start}-")
+            and _get_object_identity(r) == identity
+        ):
+            raise RuntimeError(
+                f"Could not download {url} in segments: the server did not respond with the requested range of the same object"
+            )
+        return _write_response(r, f, end - start + 1, None)
+
+
+def _get_object_identity(response: Response) -> Dict[str, Any]:
+    """Get the validators and the total size of the object behind a response."""
+    size: Optional[int] = None
+    if response.headers.get("content-encoding", "identity") != "identity":
+        # The body is decoded on the fly, so the sizes on the wire mean nothing to us
+        pass
+    elif response.status_code == 206:
+        # Content-Range: bytes 100-199/1234
+        _, _, total = response.headers.get("content-range", "").rpartition("/")
+        if total.isdigit():
+            size = int(total)
+    elif "content-length" in response.headers:
+        size = int(response.headers["content-length"])
+    return {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "size": size,
+    }
+
+
+def _is_resumable_response(
+    response: Response,
+    part_state: Optional[Dict[str, Any]],
+    identity: Dict[str, Any],
+    offset: int,
+) -> bool:
+    if not part_state or response.status_code != 206:
+        return False
+    content_range = response.headers.get("content-range", "")
+    if not content_range.startswith(f"bytes {offset}-"):
+        return False
+    if part_state.get("size") is None or part_state["size"] != identity["size"]:
+        return False
+    if part_state.get("etag"):
+        return bool(part_state["etag"] == identity["etag"])
+    return bool(
+        part_state.get("last_modified")
+        and part_state["last_modified"] == identity["last_modified"]
+    )
+
+
+def _read_part_state(part_path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.isfile(part_path):
+        return None
     try:
-        os.replace(tmp_path, path)
+        with open(f"{part_path}.json") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("preallocated"):
+        # A preallocated part file that was never truncated (the process was killed?)
+        # is of the full size no matter how much of it was received.
+        return None
+    return state
+
+
+def _write_part_state(part_path: str, state: Dict[str, Any]) -> None:
+    with open(f"{part_path}.json", "w") as f:
+        json.dump(state, f)
+
+
+def _discard_partial_download(part_path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(part_path)
+    _remove_part_state(part_path)
+
+
+def _remove_part_state(part_path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(f"{part_path}.json")
+
+
+def is_unchanged(url: str, path: str) -> bool:
+    """Tell whether the object at `url` is still the one that was downloaded into `path`.
+
+    Asks the server with a conditional request, using the ETag and Last-Modified
+    validators stored when the file was downloaded. Returns False if that can't be
+    told for sure: no validators were stored, the file has been modified locally,
+    or the request fails (the download that follows will retry it).
+    Datums are immutable, and thus always unchanged; local files are linked anew.
+    """
+    if url.startswith("datum://"):
+        return True
+    if is_file_uri(url):
+        return False  # linking it again costs nothing
+    validators = _read_validators(path)
+    if not validators or validators.get("size") != os.path.getsize(path):
+        return False
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    try:
+        # The body is not read unless the object has changed
+        with get_http_session().get(url, stream=True, headers=headers) as r:
+            if r.status_code == 304:
+                return True
+            # Servers that don't do conditional requests send the object as usual
+            return r.ok and _get_object_identity(r) == {
+                key: validators.get(key) for key in ("etag", "last_modified", "size")
+            }
+    except OSError:  # requests' exceptions are IOErrors
+        return False
+
+
+def _get_validators_path(path: str, create: bool = False) -> str:
+    return get_state_path(path, VALIDATORS_SUFFIX, create)
+
+
+def _read_validators(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_get_validators_path(path)) as f:
+            validators = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return validators if isinstance(validators, dict) else None
+
+
+def _write_validators(
+    path: str,
+    identity: Dict[str, Any],
+    verifier: Optional[ChecksumVerifier] = None,
+) -> None:
+    validators_path = _get_validators_path(path)
+    if not (identity["etag"] or identity["last_modified"] or verifier):
+        # Don't leave the validators of an earlier download lying around
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(validators_path)
+        return
+    with contextlib.suppress(OSError):
+        os.makedirs(os.path.dirname(validators_path), exist_ok=True)
+        with open(validators_path, "w") as f:
+            json.dump({**identity, **_get_verified_state(path, verifier)}, f)
+
+
+def _get_verified_state(
+    path: str, verifier: Optional[ChecksumVerifier]
+) -> Dict[str, Any]:
+    """Describe `path` as it is now, and the checksum it was verified against, if any."""
+    stat = os.stat(path)
+    state: Dict[str, Any] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if verifier:
+        state["checksums"] = {verifier.algorithm: verifier.expected}
+    return state
+
+
+def is_intact(
+    path: str,
+    size: Optional[int] = None,
+    checksums: Optional[Dict[str, str]] = None,
+    scan: Optional[DirectoryScan] = None,
+) -> bool:
+    """Tell whether `path` is a complete, undamaged copy of a file of the given size.
+
+    When `VH_VERIFY_CACHED_INPUTS` is enabled, the file is also verified against
+    the given checksums. As hashing large files takes a while, files that have been
+    verified (as they were downloaded, or here) are not hashed again until modified.
+
+    When checking many files, pass a `scan` to look them up from instead of calling
+    `os.stat()` for each.
+    """
+    verifier = ChecksumVerifier(checksums)
+    verify = bool(verifier) and should_verify_cached_inputs()
+    entry = scan.get_entry(path) if scan is not None else None
+    if scan is not None:
+        if entry is None or not entry.is_file():
+            return False
+        if size is None and not verify:
+            return True
+    try:
+        stat = entry.stat() if entry is not None else os.stat(path)
     except OSError:
-        # different filesystems, for example a tmp filesystem, Docker volume, etc
-        if os.path.isfile(path):
-            os.remove(path)
-        shutil.copy(tmp_path, path)
+        return False
+    if not S_ISREG(stat.st_mode) or (size is not None and stat.st_size != size):
+        return False
+    if not verify:
+        return True
+    verified_key = (
+        os.path.abspath(path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        verifier.algorithm,
+        verifier.expected,
+    )
+    if verified_key in _verified_files:
+        return True
+    validators = _read_validators(path) or {}
+    if (
+        validators.get("size") == stat.st_size
+        and validators.get("mtime_ns") == stat.st_mtime_ns
+        and validators.get("checksums") == {verifier.algorithm: verifier.expected}
+    ):
+        return True
+    verifier.update_from_file(path)
+    try:
+        verifier.verify(path)
+    except ChecksumMismatch:
+        return False
+    # Remember it in memory too, in case the directory is read-only
+    _verified_files.add(verified_key)
+    with contextlib.suppress(OSError), open(
+        _get_validators_path(path, create=True), "w"
+    ) as f:
+        json.dump({**validators, **_get_verified_state(path, verifier)}, f)
+    return True
+
+
+def should_verify_cached_inputs() -> bool:
+    return string_to_bool(os.environ.get("VH_VERIFY_CACHED_INPUTS", "false"))
 
 
 def request_download_urls(input_id: str) -> Dict[str, str]:
@@ -138,6 +1301,14 @@ def request_download_urls(input_id: str) -> Dict[str, str]:
 
     Returns a dict of filename -> download URL for the given input.
     """
+    return request_batch_download_urls([input_id]).get(input_id, {})
+
+
+def request_batch_download_urls(input_ids: List[str]) -> Dict[str, Dict[str, str]]:
+    """Request download URLs for several inputs from Valohai in one go.
+
+    Returns a dict of input ID -> filename -> download URL for the given inputs.
+    """
     try:
         import requests
     except ImportError as ie:
@@ -145,17 +1316,18 @@ def request_download_urls(input_id: str) -> Dict[str, str]:
 
     try:
         response = send_api_request(
-            endpoint="input_request", params={"inputs": [input_id]}
+            endpoint="input_request", params={"inputs": input_ids}
         )
         response.raise_for_status()
     except requests.RequestException as e:
         raise RuntimeError("Could not get new input download URLs") from e
 
-    # While we should only get the single input we request in the response, this does handle the case
-    # that we also get unrelated inputs.
-    return dict(
-        (input_file["filename"], input_file["url"])
-        for input_request in response.json()
-        for input_file in input_request["files"]
-        if input_file["input_id"] == input_id
-    )
+    # We may also get unrelated inputs in the response; leave those out.
+    urls: Dict[str, Dict[str, str]] = {}
+    for input_request in response.json():
+        for input_file in input_request["files"]:
+            if input_file["input_id"] in input_ids:
+                urls.setdefault(input_file["input_id"], {})[input_file["filename"]] = (
+                    input_file["url"]
+                )
+    return urls
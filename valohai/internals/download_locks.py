@@ -0,0 +1,124 @@
+"""Coordinating downloads between processes on the same host.
+
+Each file is downloaded by one process at a time, holding an exclusive lock on a `.lock`
+file kept for the target (see `get_state_path`); other processes wanting the same file
+wait, and then use the file the first one downloaded. Optionally,
+`VH_HOST_DOWNLOAD_CONCURRENCY` caps the number of transfers running at once across all
+processes on the host.
+
+File locks are only available on POSIX systems; elsewhere, there is no coordination.
+"""
+
+import contextlib
+import os
+import tempfile
+import time
+from typing import Iterator, Optional
+
+from valohai.internals.utils import get_int_from_env
+
+LOCK_SUFFIX = ".lock"
+SLOT_POLL_INTERVAL = 0.1
+STATE_DIR_NAME = ".valohai-download"
+
+
+def get_state_path(path: str, suffix: str, create: bool = False) -> str:
+    """Get the path of a file kept for downloading `path`, e.g. its lock or partial data.
+
+    They are kept in a hidden directory next to `path` (on the same filesystem, so they can
+    be moved into place), rather than among the files of the input. With `create`, the
+    directory is created if necessary.
+    """
+    directory, filename = os.path.split(path)
+    if os.path.basename(directory) != STATE_DIR_NAME:
+        directory = os.path.join(directory, STATE_DIR_NAME)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{filename}{suffix}")
+
+
+@contextlib.contextmanager
+def lock_file(path: str) -> Iterator[bool]:
+    """Hold an exclusive lock for downloading `path`.
+
+    Yields True if another process was holding the lock, i.e. it had to be waited for.
+    """
+    try:
+        import fcntl
+    except ImportError:  # Not on a POSIX system
+        yield False
+        return
+    lock_path = get_state_path(path, LOCK_SUFFIX, create=True)
+    waited = False
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            waited = True
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        # The previous holder removes the lock file when done; make sure we didn't
+        # lock a file that no longer exists, while someone else locks a new one.
+        if _is_same_file(fd, lock_path):
+            break
+        os.close(fd)
+    try:
+        yield waited
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lock_path)
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def download_slot() -> Iterator[None]:
+    """Wait for one of the `VH_HOST_DOWNLOAD_CONCURRENCY` host-wide download slots, if set."""
+    slots = get_host_download_concurrency()
+    if not slots:
+        yield
+        return
+    try:
+        import fcntl
+    except ImportError:  # Not on a POSIX system
+        yield
+        return
+    slot_dir = os.environ.get("VH_DOWNLOAD_SLOT_DIR") or os.path.join(
+        tempfile.gettempdir(), "valohai-download-slots"
+    )
+    os.makedirs(slot_dir, exist_ok=True)
+    fds = [
+        os.open(
+            os.path.join(slot_dir, f"slot-{i}{LOCK_SUFFIX}"),
+            os.O_RDWR | os.O_CREAT,
+            0o666,
+        )
+        for i in range(slots)
+    ]
+    try:
+        while True:
+            for fd in fds:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                yield  # the lock is released as the file is closed
+                return
+            time.sleep(SLOT_POLL_INTERVAL)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def get_host_download_concurrency() -> Optional[int]:
+    if not os.environ.get("VH_HOST_DOWNLOAD_CONCURRENCY"):
+        return None
+    return get_int_from_env("VH_HOST_DOWNLOAD_CONCURRENCY", 1)
+
+
+def _is_same_file(fd: int, path: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fd_stat = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (fd_stat.st_dev, fd_stat.st_ino)
@@ -0,0 +1,194 @@
+"""Recording how the downloads of input files went, for tuning and troubleshooting."""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from valohai.internals.utils import string_to_bool
+
+_records: List["DownloadRecord"] = []
+_records_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class DownloadRecord:
+    """How the download of a single file went."""
+
+    # without the query string, which may contain credentials
+    url: str
+    path: str
+    # of the resulting file
+    size: Optional[int]
+    # in this process, i.e. not counting a resumed partial download
+    bytes_downloaded: int
+    # UNIX timestamp
+    started_at: float
+    # seconds from the first request (or from `started_at`, if none was made) to the end
+    duration: float
+    # seconds from the request to the response headers
+    time_to_first_byte: Optional[float]
+    retries: int
+    # the file was already on disk, or in the local input cache
+    cache_hit: bool
+    error: Optional[str] = None
+    # seconds from `started_at` to the first request, i.e. waiting for the file lock,
+    # a host-wide download slot, and the input cache
+    wait_time: float = 0.0
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Bytes per second, or None if nothing was downloaded."""
+        if not self.bytes_downloaded or self.duration <= 0:
+            return None
+        return self.bytes_downloaded / self.duration
+
+
+class DownloadRecorder:
+    """Collects the stats of a single file download as it progresses."""
+
+    def __init__(self, url: str, path: str) -> None:
+        self.url = url
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self.bytes_downloaded = 0
+        self.time_to_first_byte: Optional[float] = None
+        self.retries = 0
+        # time.monotonic() of the first request, and of the request of the current attempt
+        self.first_request_at: Optional[float] = None
+        self.request_at: Optional[float] = None
+        # time.monotonic() of the response that `time_to_first_byte` was measured of
+        self.response_at: Optional[float] = None
+
+    def request_sent(self) -> None:
+        """Mark the start of a request; called for each attempt, once it's no longer queued."""
+        self.request_at = time.monotonic()
+        if self.first_request_at is None:
+            self.first_request_at = self.request_at
+
+    def response_received(self) -> None:
+        if self.time_to_first_byte is None:
+            self.response_at = time.monotonic()
+            self.time_to_first_byte = self.response_at - (
+                self.request_at if self.request_at is not None else self._start
+            )
+
+    def add_bytes(self, count: int) -> None:
+        with self._lock:  # segments are downloaded concurrently
+            self.bytes_downloaded += count
+
+    def add_attempt(self, other: "DownloadRecorder") -> None:
+        """Count in the stats of another download of the same file, e.g. from a mirror."""
+        self.add_bytes(other.bytes_downloaded)
+        self.retries += other.retries
+        if other.first_request_at is not None and (
+            self.first_request_at is None
+            or other.first_request_at < self.first_request_at
+        ):
+            self.first_request_at = other.first_request_at
+        if other.time_to_first_byte is not None and (
+            self.time_to_first_byte is None
+            or other.time_to_first_byte < self.time_to_first_byte
+        ):
+            self.time_to_first_byte = other.time_to_first_byte
+            self.response_at = other.response_at
+
+    def finish(
+        self,
+        path: Optional[str] = None,
+        *,
+        cache_hit: bool = False,
+        error: Optional[BaseException] = None,
+    ) -> DownloadRecord:
+        path = path or self.path
+        try:
+            size: Optional[int] = os.path.getsize(path)
+        except OSError:
+            size = None
+        now = time.monotonic()
+        first_request_at = (
+            self.first_request_at if self.first_request_at is not None else self._start
+        )
+        record = DownloadRecord(
+            url=_strip_query(self.url),
+            path=path,
+            size=size,
+            bytes_downloaded=self.bytes_downloaded,
+            started_at=self.started_at,
+            duration=now - first_request_at,
+            time_to_first_byte=self.time_to_first_byte,
+            retries=self.retries,
+            cache_hit=cache_hit,
+            error=f"{error.__class__.__name__}: {error}" if error else None,
+            wait_time=first_request_at - self._start,
+        )
+        with _records_lock:
+            _records.append(record)
+        return record
+
+
+def get_download_records() -> List[DownloadRecord]:
+    with _records_lock:
+        return list(_records)
+
+
+def clear_download_records() -> None:
+    with _records_lock:
+        _records.clear()
+
+
+def summarize(records: List[DownloadRecord]) -> Dict[str, Any]:
+    """Get the totals of the given downloads, as Valohai metadata."""
+    downloaded = [r for r in records if not r.cache_hit and not r.error]
+    ttfbs = [r.time_to_first_byte for r in downloaded if r.time_to_first_byte]
+    wait_times = [r.wait_time for r in downloaded]
+    total_bytes = sum(r.bytes_downloaded for r in records)
+    if records:
+        # The wall-clock time it took, as files are downloaded concurrently
+        wall_time = max(r.started_at + r.wait_time + r.duration for r in records) - min(
+            r.started_at for r in records
+        )
+    else:
+        wall_time = 0.0
+    summary: Dict[str, Any] = {
+        "download_files": len(records),
+        "download_cache_hits": sum(r.cache_hit for r in records),
+        "download_errors": sum(bool(r.error) for r in records),
+        "download_retries": sum(r.retries for r in records),
+        "download_bytes": total_bytes,
+        "download_seconds": round(wall_time, 3),
+        "download_throughput": round(total_bytes / wall_time) if wall_time else 0,
+    }
+    if ttfbs:
+        summary["download_max_ttfb"] = round(max(ttfbs), 3)
+    if wait_times:
+        summary["download_max_wait"] = round(max(wait_times), 3)
+    return summary
+
+
+def log_download_stats(records: List[DownloadRecord], **extra: Any) -> None:
+    """Print a summary of the given downloads, and log it as Valohai metadata."""
+    from valohai.metadata import Logger
+
+    summary = summarize(records)
+    print(  # noqa: T201
+        f"Downloaded {summary['download_files']} files "
+        f"({summary['download_cache_hits']} cached, {summary['download_errors']} failed, "
+        f"{summary['download_retries']} retries): "
+        f"{summary['download_bytes'] / 1048576:.1f} MiB in {summary['download_seconds']:.1f} s "
+        f"({summary['download_throughput'] / 1048576:.1f} MiB/s)"
+    )
+    with Logger() as logger:
+        logger.log(**extra, **summary)
+
+
+def should_log_download_stats() -> bool:
+    return string_to_bool(os.environ.get("VH_LOG_DOWNLOAD_STATS", "false"))
+
+
+def _strip_query(url: str) -> str:
+    return urlunsplit(urlsplit(url)._replace(query="", fragment=""))
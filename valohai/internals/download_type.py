@@ -5,3 +5,4 @@ class DownloadType(Enum):
     NEVER = 0
     OPTIONAL = 1  # Only download when not found from cache
     ALWAYS = 2
+    REVALIDATE = 3  # Download when not found from cache, or changed since
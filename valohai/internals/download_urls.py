@@ -0,0 +1,113 @@
+"""Resolving and caching the download URLs of on-demand inputs.
+
+Download URLs are requested from Valohai in one batch for all the inputs that need them,
+and cached in memory until shortly before they expire.
+"""
+
+import calendar
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from valohai.internals.download import request_batch_download_urls
+
+# How long to trust a URL whose expiry can not be told from the URL itself
+DEFAULT_URL_TTL = 600.0
+# How long before their expiry URLs are considered expired, so downloads can get going
+EXPIRY_MARGIN = 60.0
+
+_cache: Dict[str, Tuple[float, Dict[str, str]]] = {}  # input ID -> (expiry, URLs)
+_lock = threading.Lock()
+
+
+def get_download_urls(input_id: str) -> Dict[str, str]:
+    """Get a dict of filename -> download URL for the given input.
+
+    When the URLs for the input are not cached, they are requested along with the
+    URLs of all the other on-demand inputs of this execution that haven't been
+    prepared for downloading yet.
+    """
+    with _lock:
+        now = time.time()
+        if _is_cached(input_id, now):
+            return _cache[input_id][1]
+        _cache.pop(input_id, None)
+        input_ids = dict.fromkeys(
+            [input_id]
+            + [
+                other_id
+                for other_id in _get_pending_input_ids()
+                if not _is_cached(other_id, now)
+            ]
+        )
+        for resolved_id, urls in request_batch_download_urls(list(input_ids)).items():
+            _cache[resolved_id] = (get_urls_expiry(urls.values(), now), urls)
+        return _cache[input_id][1] if input_id in _cache else {}
+
+
+def invalidate_download_urls(input_id: str) -> None:
+    """Forget the cached URLs of an input, e.g. because they were refused."""
+    with _lock:
+        _cache.pop(input_id, None)
+
+
+def clear_download_urls() -> None:
+    with _lock:
+        _cache.clear()
+
+
+def get_urls_expiry(urls: Iterable[str], now: Optional[float] = None) -> float:
+    """Get the time after which not all of the given URLs can be trusted to work anymore."""
+    if now is None:
+        now = time.time()
+    expiries = [get_url_expiry(url) for url in urls]
+    expiry = min((e for e in expiries if e is not None), default=now + DEFAULT_URL_TTL)
+    return expiry - EXPIRY_MARGIN
+
+
+def get_url_expiry(url: str) -> Optional[float]:
+    """Tell when a presigned URL expires, as a UNIX timestamp, or None if unknown.
+
+    Understands AWS (signature versions 2 and 4), Google Cloud Storage and Azure SAS URLs.
+    """
+    query = {
+        key.lower(): values[0] for key, values in parse_qs(urlparse(url).query).items()
+    }
+    try:
+        for prefix in ("x-amz", "x-goog"):
+            if f"{prefix}-date" in query and f"{prefix}-expires" in query:
+                signed_at = _parse_timestamp(query[f"{prefix}-date"], "%Y%m%dT%H%M%SZ")
+                return signed_at + int(query[f"{prefix}-expires"])
+        if "expires" in query:
+            return float(query["expires"])
+        if "se" in query:
+            return _parse_timestamp(query["se"], "%Y-%m-%dT%H:%M:%SZ")
+    except ValueError:
+        pass
+    return None
+
+
+def _parse_timestamp(value: str, format: str) -> float:
+    return float(calendar.timegm(time.strptime(value, format)))
+
+
+def _is_cached(input_id: str, now: float) -> bool:
+    cached = _cache.get(input_id)
+    return bool(cached and cached[0] > now)
+
+
+def _get_pending_input_ids() -> List[str]:
+    """Get the IDs of the on-demand inputs of this execution that haven't been prepared
+    for downloading yet.
+
+    This is called with the lock held, so it must not look at the files of the inputs;
+    inputs that happen to be on disk already only cost their URLs in the batch.
+    """
+    from valohai.internals import global_state
+
+    return [
+        input_info.input_id
+        for input_info in global_state.inputs.values()
+        if input_info.input_id and not input_info.download_prepared
+    ]
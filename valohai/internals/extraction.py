@@ -0,0 +1,105 @@
+"""Unpacking tar archives into the input directory as they are downloaded.
+
+Enabled with `VH_EXTRACT_ON_DOWNLOAD=true`. The archive itself never hits the disk:
+its members are written into a hidden `.<archive name>.extracted` directory of their own
+next to where it would have been, so members of different archives can't collide with
+each other or with the other files of the input. Once all of them have been written,
+they are listed in a `.<archive name>.extracted.json` manifest, which stands in for the
+archive when the input is read (see `vfs.add_disk_file`).
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import tarfile
+from typing import IO, Any, Dict, List, Optional
+
+from valohai.internals.utils import string_to_bool
+from valohai.internals.vfs import is_tar_name
+
+EXTRACTION_DIR_SUFFIX = ".extracted"
+MANIFEST_SUFFIX = f"{EXTRACTION_DIR_SUFFIX}.json"
+
+
+def should_extract_on_download(name: str) -> bool:
+    return is_tar_name(name) and string_to_bool(
+        os.environ.get("VH_EXTRACT_ON_DOWNLOAD", "false")
+    )
+
+
+def get_extraction_dir(archive_path: str) -> str:
+    directory, filename = os.path.split(archive_path)
+    return os.path.join(directory, f".{filename}{EXTRACTION_DIR_SUFFIX}")
+
+
+def get_manifest_path(archive_path: str) -> str:
+    return f"{get_extraction_dir(archive_path)}.json"
+
+
+def read_manifest(archive_path: str) -> Optional[List[str]]:
+    """Get the paths (relative to the extraction directory) of the extracted members.
+
+    Returns None if the archive hasn't been extracted, or not completely.
+    """
+    try:
+        with open(get_manifest_path(archive_path)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    members = manifest.get("members") if isinstance(manifest, dict) else None
+    return members if isinstance(members, list) else None
+
+
+def write_manifest(
+    archive_path: str, members: List[str], identity: Dict[str, Any]
+) -> None:
+    manifest_path = get_manifest_path(archive_path)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**identity, "members": members}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def remove_extracted(archive_path: str) -> None:
+    """Remove the manifest and the extraction directory of the archive."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(get_manifest_path(archive_path))
+    shutil.rmtree(get_extraction_dir(archive_path), ignore_errors=True)
+
+
+def extract_tar_stream(stream: IO[bytes], archive_path: str) -> List[str]:
+    """Unpack the (optionally compressed) tar archive read from `stream` for `archive_path`.
+
+    Only regular files are extracted, as they are the only members the VFS shows.
+    Returns their paths relative to the extraction directory (see `get_extraction_dir`).
+    Members that would end up outside the directory are refused with ValueError,
+    and whatever was extracted until then is removed.
+    """
+    remove_extracted(archive_path)
+    directory = get_extraction_dir(archive_path)
+    members: List[str] = []
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*") as tf:
+            for tarinfo in tf:
+                if not tarinfo.isreg():
+                    continue
+                member = _get_safe_member_path(tarinfo.name)
+                member_path = os.path.join(directory, member)
+                os.makedirs(os.path.dirname(member_path) or ".", exist_ok=True)
+                src = tf.extractfile(tarinfo)
+                assert src  # always there for regular files
+                members.append(member)
+                with src, open(member_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+    except BaseException:
+        remove_extracted(archive_path)
+        raise
+    return members
+
+
+def _get_safe_member_path(name: str) -> str:
+    member = os.path.normpath(name)
+    if os.path.isabs(member) or member == ".." or member.startswith(f"..{os.sep}"):
+        raise ValueError(f"Refusing to extract {name}: it is outside of the archive")
+    return member
@@ -12,11 +12,12 @@ environment: Optional[str] = None
 upload_store: Optional[str] = None
 distributed = Distributed()
 multifile: bool = False
+download_concurrency: Optional[int] = None
 
 
 def flush_global_state() -> None:
     # fmt: off
-    global loaded, inputs, parameters, step_name, image_name, distributed, environment, upload_store, multifile
+    global loaded, inputs, parameters, step_name, image_name, distributed, environment, upload_store, multifile, download_concurrency
     # fmt: off
     loaded = False
     inputs = {}
@@ -26,4 +27,5 @@ def flush_global_state() -> None:
     environment = None
     upload_store = None
     multifile = False
+    download_concurrency = None
     distributed.flush_state()
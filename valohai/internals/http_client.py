@@ -0,0 +1,76 @@
+"""A process-wide pooled HTTP client shared by downloads, API calls and webhooks."""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from valohai.internals.concurrency import get_download_concurrency
+from valohai.internals.utils import get_int_from_env, string_to_bool
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_POOL_CONNECTIONS = 10
+
+_lock = threading.Lock()
+_session: Optional["requests.Session"] = None
+_session_pid: Optional[int] = None
+
+
+def get_http_session() -> "requests.Session":
+    """Get the shared `requests.Session` for this process.
+
+    The session is created on first use and recreated in a forked child process
+    (e.g. a DataLoader worker), so connections are never shared across processes.
+
+    Pool sizes can be configured with the `VH_HTTP_POOL_CONNECTIONS` (number of hosts
+    to keep pools for) and `VH_HTTP_POOL_MAXSIZE` (connections per host) environment
+    variables. Setting `VH_HTTP_KEEPALIVE=false` disables connection reuse.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    session = _session
+    if session is not None and _session_pid == pid:
+        return session
+    with _lock:
+        if _session is None or _session_pid != pid:
+            _session = _create_session()
+            _session_pid = pid
+        return _session
+
+
+def reset_http_session() -> None:
+    """Forget the shared session; a new one is created on next use."""
+    global _lock, _session, _session_pid
+    # The lock may have been held by another thread at the time of a fork,
+    # and the pooled sockets are shared with the parent process,
+    # so we replace both rather than closing anything.
+    _lock = threading.Lock()
+    _session = None
+    _session_pid = None
+
+
+def _create_session() -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_connections = get_int_from_env(
+        "VH_HTTP_POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS
+    )
+    pool_maxsize = get_int_from_env(
+        "VH_HTTP_POOL_MAXSIZE",
+        max(DEFAULT_POOL_CONNECTIONS, get_download_concurrency()),
+    )
+    session = requests.Session()
+    for prefix in ("https://", "http://"):
+        session.mount(
+            prefix,
+            HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize),
+        )
+    if not string_to_bool(os.environ.get("VH_HTTP_KEEPALIVE", "true")):
+        session.headers["Connection"] = "close"
+    return session
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_http_session)
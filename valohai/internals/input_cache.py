@@ -0,0 +1,261 @@
+"""A content-addressed, size-bounded store of downloaded inputs, shared across steps.
+
+Only used when running locally, and only when `VH_INPUT_CACHE_DIR` is set.
+Files in the store are keyed by their checksum (or their URI when no checksum is known),
+and materialized into the input directories as hardlinks (or reflinks, or copies as a
+last resort). The least recently used files are evicted once the store grows over
+`VH_INPUT_CACHE_MAX_SIZE` bytes; to keep storing many small files cheap, the size of
+the store is kept as a running total in a file shared by all the processes using it,
+and checked once per input (see `evict_if_necessary`).
+
+As the files are hardlinked, their own modification times belong to the input files
+too, so when each file was last used is recorded by touching a `.used` marker next to
+it instead. Files still linked from an input directory are never evicted, since
+removing them wouldn't free any space.
+"""
+
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from valohai.config import is_running_in_valohai
+from valohai.internals.download_locks import lock_file
+from valohai.internals.utils import get_int_from_env
+
+DEFAULT_MAX_SIZE = 20 * 1024**3
+
+FICLONE = 0x40049409  # from linux/fs.h
+
+USED_SUFFIX = ".used"
+
+# Held along with the lock on the size file, which doesn't keep out threads on all systems
+_lock = threading.Lock()
+
+
+def get_input_cache_dir() -> Optional[str]:
+    if is_running_in_valohai():
+        return None
+    return os.environ.get("VH_INPUT_CACHE_DIR") or None
+
+
+def get_cache_key(uri: Optional[str], checksums: Dict[str, str]) -> Optional[str]:
+    """Get the key under which a file is stored, or None if it shouldn't be cached."""
+    if checksums.get("sha256"):
+        return f"sha256-{checksums['sha256'].lower()}"
+    if not uri or uri.startswith("datum://"):
+        return None
+    return f"uri-{hashlib.sha256(uri.encode('utf-8')).hexdigest()}"
+
+
+def get_object_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, "objects", key[-2:], key)
+
+
+def get_used_marker_path(object_path: str) -> str:
+    return f"{object_path}{USED_SUFFIX}"
+
+
+def get_size_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, "size")
+
+
+def materialize(cache_dir: str, key: str, path: str) -> bool:
+    """Make the cached file for `key` available at `path`.
+
+    Returns False if there is no such file in the cache.
+    """
+    object_path = get_object_path(cache_dir, key)
+    if not os.path.isfile(object_path):
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+    try:
+        link_or_copy(object_path, path)
+    except FileNotFoundError:  # evicted just now
+        return False
+    _mark_used(object_path)
+    return True
+
+
+def store(cache_dir: str, key: str, path: str) -> None:
+    """Add the downloaded file at `path` into the cache under `key`."""
+    max_size = get_int_from_env("VH_INPUT_CACHE_MAX_SIZE", DEFAULT_MAX_SIZE)
+    if os.path.getsize(path) > max_size:
+        return
+    object_path = get_object_path(cache_dir, key)
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        link_or_copy(path, tmp_path)
+        with _lock_size(cache_dir):
+            replaced_size = _get_size(object_path)
+            os.replace(tmp_path, object_path)
+            _mark_used(object_path)
+            _add_size(cache_dir, _get_size(object_path) - replaced_size)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+
+
+def evict_if_necessary() -> None:
+    """Evict files from the cache if it has grown over its maximum size.
+
+    Meant to be called once the files of an input have been stored, rather than
+    after each of them. The size of the cache is only scanned when there is no
+    running total for it yet (see `_add_size`).
+    """
+    cache_dir = get_input_cache_dir()
+    if not cache_dir:
+        return
+    total_size = _read_total_size(cache_dir)
+    max_size = get_int_from_env("VH_INPUT_CACHE_MAX_SIZE", DEFAULT_MAX_SIZE)
+    if total_size is not None and total_size > max_size:
+        evict(cache_dir, max_size)
+
+
+def evict(cache_dir: str, max_size: int) -> None:
+    """Remove the least recently used files until the cache fits in `max_size` bytes.
+
+    Files that are also linked from elsewhere (i.e. input directories) are kept,
+    and keep counting towards the size.
+    """
+    with _lock_size(cache_dir):
+        entries = _list_objects(cache_dir)
+        total_size = sum(size for _, size, _, _ in entries)
+        for _, size, links, file_path in sorted(entries):
+            if total_size <= max_size:
+                break
+            if links > 1:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+                total_size -= size
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(get_used_marker_path(file_path))
+        _write_total_size(cache_dir, total_size)
+
+
+@contextlib.contextmanager
+def _lock_size(cache_dir: str) -> Iterator[None]:
+    """Hold the lock on the running total of the size of the cache, across processes."""
+    with _lock, lock_file(get_size_path(cache_dir)):
+        yield
+
+
+def _add_size(cache_dir: str, size: int) -> None:
+    """Add to the running total; to be called with `_lock_size` held."""
+    total_size = _read_total_size(cache_dir)
+    if total_size is None:
+        # The first time, find out what is there already (including the file just stored)
+        total_size = sum(size for _, size, _, _ in _list_objects(cache_dir))
+    else:
+        total_size += size
+    _write_total_size(cache_dir, total_size)
+
+
+def _read_total_size(cache_dir: str) -> Optional[int]:
+    try:
+        with open(get_size_path(cache_dir)) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_total_size(cache_dir: str, total_size: int) -> None:
+    size_path = get_size_path(cache_dir)
+    tmp_path = f"{size_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(total_size))
+    os.replace(tmp_path, size_path)
+
+
+def _get_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _mark_used(object_path: str) -> None:
+    marker_path = get_used_marker_path(object_path)
+    with contextlib.suppress(OSError):
+        with open(marker_path, "a"):
+            pass
+        os.utime(marker_path)
+
+
+def _list_objects(cache_dir: str) -> List[Tuple[float, int, int, str]]:
+    """List the (time of last use, size, number of links, path) of each file in the cache."""
+    entries: List[Tuple[float, int, int, str]] = []
+    for dirpath, _, filenames in os.walk(os.path.join(cache_dir, "objects")):
+        for filename in filenames:
+            if filename.endswith((".tmp", USED_SUFFIX)):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            with contextlib.suppress(FileNotFoundError):
+                stat = os.stat(file_path)
+                used_at = stat.st_mtime
+                with contextlib.suppress(FileNotFoundError):
+                    used_at = os.stat(get_used_marker_path(file_path)).st_mtime
+                entries.append((used_at, stat.st_size, stat.st_nlink, file_path))
+    return entries
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Make `src` available at `dst` without copying data if the filesystem allows."""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    copy_file(src, dst)
+
+
+def copy_file(src: str, dst: str) -> None:
+    """Copy `src` into `dst`, without the data passing through Python if possible.
+
+    Tries a reflink (copy-on-write clone), then `copy_file_range()` (which lets e.g.
+    NFS 4.2 servers copy on the server side), and then `shutil.copyfile()`, which
+    uses `sendfile()` where available.
+    """
+    if _reflink(src, dst) or _copy_file_range(src, dst):
+        return
+    shutil.copyfile(src, dst)
+
+
+def _reflink(src: str, dst: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # Not on a POSIX system
+        return False
+    with open(src, "rb") as src_f, open(dst, "wb") as dst_f:
+        try:
+            fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(dst)
+    return False
+
+
+def _copy_file_range(src: str, dst: str) -> bool:
+    if not hasattr(os, "copy_file_range"):  # Not on Linux
+        return False
+    with open(src, "rb") as src_f, open(dst, "wb") as dst_f:
+        remaining = os.fstat(src_f.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src_f.fileno(), dst_f.fileno(), remaining)
+                if not copied:  # some filesystems report nothing to copy
+                    break
+                remaining -= copied
+        except OSError:
+            pass
+    if remaining == 0:
+        return True
+    os.remove(dst)
+    return False
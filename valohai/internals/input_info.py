@@ -1,16 +1,65 @@
+import array
+import asyncio
+import contextlib
+import functools
 import glob
 import os
-from typing import Any, Dict, Iterable, List, Optional, Union
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+    overload,
+)
 
 from valohai_yaml.utils import listify
 
-from valohai.internals.download import download_url, request_download_urls
+from valohai.internals.concurrency import get_download_concurrency, map_concurrently
+from valohai.internals.directory_scan import DirectoryScan
+from valohai.internals.download import (
+    UrlRefresher,
+    download_and_extract,
+    download_url,
+    is_intact,
+    resolve_datums,
+)
+from valohai.internals.download_urls import get_download_urls, invalidate_download_urls
+from valohai.internals.download_stats import (
+    get_download_records,
+    log_download_stats,
+    should_log_download_stats,
+)
 from valohai.internals.download_type import DownloadType
-from valohai.internals.utils import uri_to_filename
+from valohai.internals.extraction import get_manifest_path, should_extract_on_download
+from valohai.internals.input_cache import evict_if_necessary, get_cache_key
+from valohai.internals.utils import file_uri_to_path, is_file_uri, uri_to_filename
+from valohai.internals.vfs import compile_path_filter, is_archive_name
 from valohai.paths import get_inputs_path
 
 
 class FileInfo:
+    # Inputs may have millions of files, so keep these small
+    __slots__ = (
+        "name",
+        "uri",
+        "download_url",
+        "path",
+        "size",
+        "datum_id",
+        "mirrors",
+        "pending_download",
+        "_checksums",
+        "_metadata",
+    )
+
     def __init__(
         self,
         *,
@@ -21,26 +70,115 @@ class FileInfo:
         checksums: Optional[Dict[str, str]] = None,
         metadata: Optional[List[Dict[str, Any]]] = None,
         datum_id: Optional[str] = None,
+        mirrors: Optional[List[str]] = None,
     ) -> None:
         self.name = str(name)
         self.uri = str(uri) if uri else None
         self.download_url = self.uri
-        self.checksums = dict(checksums) if checksums else {}
         self.path = str(path) if path else None
         self.size = int(size) if size else None
-        self.metadata = list(metadata) if metadata else []
         self.datum_id = str(datum_id) if datum_id else None
+        # Alternate URIs of the same file, to race against a slow download (see download_url)
+        self.mirrors = [str(mirror) for mirror in mirrors] if mirrors else None
+        self.pending_download: Optional[Future[None]] = None
+        # Shared with the caller (e.g. the parsed inputs.json) rather than copied
+        self._checksums = checksums or None
+        self._metadata = metadata or None
+
+    @property
+    def checksums(self) -> Dict[str, str]:
+        return self._checksums if self._checksums is not None else {}
+
+    @checksums.setter
+    def checksums(self, checksums: Optional[Dict[str, str]]) -> None:
+        self._checksums = checksums or None
+
+    @property
+    def metadata(self) -> List[Dict[str, Any]]:
+        return self._metadata if self._metadata is not None else []
+
+    @metadata.setter
+    def metadata(self, metadata: Optional[List[Dict[str, Any]]]) -> None:
+        self._metadata = metadata or None
+
+    def is_downloaded(self, scan: Optional[DirectoryScan] = None) -> Optional[bool]:
+        """Tell whether the file is on disk, and intact as far as can be told (see `is_intact`).
+
+        When checking many files, pass a `scan` to look them up from.
+        """
+        return _is_downloaded(self.path, self.size, self._checksums, scan)
 
-    def is_downloaded(self) -> Optional[bool]:
-        return bool(self.path and os.path.isfile(self.path))
+    def is_extracted(self, scan: Optional[DirectoryScan] = None) -> bool:
+        """Tell whether the file is an archive that was unpacked as it was downloaded."""
+        return _is_extracted(self.path, scan)
+
+    def is_available(
+        self, scan: Optional[DirectoryScan] = None, extract: bool = False
+    ) -> bool:
+        """Tell whether the file is on disk, or with `extract`, the archive has been unpacked."""
+        return bool(self.is_downloaded(scan) or (extract and self.is_extracted(scan)))
+
+    def wait_for_pending_download(self) -> None:
+        """Wait for a background download of this file to finish, if there is one.
+
+        Raises the exception of a failed background download (once; after that,
+        the file will be downloaded in the foreground as usual).
+        """
+        pending_download = self.pending_download
+        if pending_download is None:
+            return
+        try:
+            pending_download.result()
+        finally:
+            self.pending_download = None
+
+    def download(
+        self,
+        path: str,
+        force_download: bool = False,
+        refresh_url: Optional[UrlRefresher] = None,
+        revalidate: bool = False,
+        extract: bool = False,
+    ) -> None:
+        """Download the file into the directory `path`.
 
-    def download(self, path: str, force_download: bool = False) -> None:
+        With `extract`, a tar archive is unpacked as it is downloaded, if enabled
+        (see `should_extract_on_download`); revalidating it needs the archive itself.
+        """
         if not self.download_url:
             raise ValueError("Can not download file with no URI")
+        file_path = os.path.join(path, self.name)
+        if (
+            extract
+            and not revalidate
+            and should_extract_on_download(self.name)
+            and self.download_url.startswith(("http://", "https://"))
+        ):
+            self.path = download_and_extract(
+                self.download_url,
+                file_path,
+                force_download,
+                checksums=self.checksums,
+                refresh_url=refresh_url,
+            )
+            return
+        if (
+            not force_download
+            and os.path.exists(file_path)
+            and not is_intact(file_path, self.size, self.checksums)
+        ):
+            print(f"{file_path} is incomplete or damaged; downloading it again")  # noqa
+            force_download = True
         self.path = download_url(
-            self.download_url, os.path.join(path, self.name), force_download
+            self.download_url,
+            file_path,
+            force_download,
+            checksums=self.checksums,
+            cache_key=get_cache_key(self.uri, self.checksums),
+            refresh_url=refresh_url,
+            revalidate=revalidate,
+            mirrors=self.mirrors,
         )
-        # TODO: Store size & checksums if they become useful
 
     @classmethod
     def from_json_data(cls, json_data: Dict[str, Any]) -> "FileInfo":
@@ -52,44 +190,505 @@ class FileInfo:
             checksums=json_data.get("checksums"),
             metadata=json_data.get("metadata"),
             datum_id=json_data.get("datum_id"),
+            mirrors=json_data.get("mirrors"),
+        )
+
+
+def _is_downloaded(
+    path: Optional[str],
+    size: Optional[int],
+    checksums: Optional[Dict[str, str]],
+    scan: Optional[DirectoryScan],
+) -> bool:
+    return bool(path and is_intact(path, size, checksums, scan))
+
+
+def _is_extracted(path: Optional[str], scan: Optional[DirectoryScan]) -> bool:
+    if not path:
+        return False
+    manifest_path = get_manifest_path(path)
+    if scan is not None:
+        return scan.get_entry(manifest_path) is not None
+    return os.path.isfile(manifest_path)
+
+
+class FileInfoList(Sequence[FileInfo]):
+    """The files of an input, kept in flat columns instead of an object per file.
+
+    Inputs may have millions of files, of which only some (or none) are going to be used.
+    Names, URIs and paths are kept in lists, sizes in an array, and the attributes few
+    files have in dicts by index. The items are views into the columns (see
+    `_FileInfoView`), created as they are accessed; checks that go through every file
+    use the columns directly (see `is_downloaded` and `is_available`).
+    """
+
+    __slots__ = ("_dense", "_sizes", "_sparse", "_url_map")
+
+    def __init__(self) -> None:
+        self._dense: Dict[str, List[Any]] = {
+            "name": [],
+            "uri": [],
+            "path": [],
+            "_checksums": [],
+        }
+        self._sizes = array.array("q")  # 0 when unknown
+        self._sparse: Dict[str, Dict[int, Any]] = {
+            "download_url": {},  # where it isn't the URI or in _url_map
+            "datum_id": {},
+            "mirrors": {},
+            "_metadata": {},
+            "pending_download": {},
+        }
+        # Download URLs by filename, as resolved for the whole input (see set_download_urls)
+        self._url_map: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def from_json_data(cls, json_data: Iterable[Dict[str, Any]]) -> "FileInfoList":
+        files = cls()
+        for file_data in json_data:
+            files._append(
+                name=file_data["name"],
+                uri=file_data.get("uri"),
+                path=file_data.get("path"),
+                size=file_data.get("size"),
+                checksums=file_data.get("checksums"),
+                metadata=file_data.get("metadata"),
+                datum_id=file_data.get("datum_id"),
+                mirrors=file_data.get("mirrors"),
+            )
+        return files
+
+    @classmethod
+    def from_files(cls, file_infos: Iterable[FileInfo]) -> "FileInfoList":
+        files = cls()
+        for file in file_infos:
+            index = len(files)
+            files._append(
+                name=file.name,
+                uri=file.uri,
+                path=file.path,
+                size=file.size,
+                checksums=file.checksums,
+                metadata=file.metadata,
+                datum_id=file.datum_id,
+                mirrors=file.mirrors,
+            )
+            if file.download_url != file.uri:
+                files._set(index, "download_url", file.download_url)
+            files._set(index, "pending_download", file.pending_download)
+        return files
+
+    def _append(
+        self,
+        *,
+        name: str,
+        uri: Optional[str],
+        path: Optional[str],
+        size: Optional[int],
+        checksums: Optional[Dict[str, str]],
+        metadata: Optional[List[Dict[str, Any]]],
+        datum_id: Optional[str],
+        mirrors: Optional[List[str]],
+    ) -> None:
+        index = len(self)
+        self._dense["name"].append(str(name))
+        self._dense["uri"].append(str(uri) if uri else None)
+        self._dense["path"].append(str(path) if path else None)
+        # Shared with the caller (e.g. the parsed inputs.json) rather than copied
+        self._dense["_checksums"].append(checksums or None)
+        self._sizes.append(int(size) if size else 0)
+        self._set(index, "_metadata", metadata or None)
+        self._set(index, "datum_id", str(datum_id) if datum_id else None)
+        self._set(
+            index, "mirrors", [str(mirror) for mirror in mirrors] if mirrors else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    @overload
+    def __getitem__(self, index: int) -> FileInfo: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[FileInfo]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[FileInfo, List[FileInfo]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return _FileInfoView(self, range(len(self))[index])
+
+    def __iter__(self) -> Iterator[FileInfo]:
+        for index in range(len(self)):
+            yield _FileInfoView(self, index)
+
+    @property
+    def names(self) -> Sequence[str]:
+        return self._dense["name"]
+
+    def is_downloaded(self, index: int, scan: Optional[DirectoryScan] = None) -> bool:
+        """Like `FileInfo.is_downloaded()` for the file at `index`."""
+        return _is_downloaded(
+            self._dense["path"][index],
+            self._sizes[index] or None,
+            self._dense["_checksums"][index],
+            scan,
+        )
+
+    def is_available(
+        self, index: int, scan: Optional[DirectoryScan] = None, extract: bool = False
+    ) -> bool:
+        """Like `FileInfo.is_available()` for the file at `index`."""
+        return self.is_downloaded(index, scan) or (
+            extract and _is_extracted(self._dense["path"][index], scan)
         )
 
+    def get_download_url(self, index: int) -> Optional[str]:
+        url: Optional[str] = self._sparse["download_url"].get(index)
+        if url is None and self._url_map is not None:
+            url = self._url_map.get(self._dense["name"][index])
+        if url is None:
+            url = self._dense["uri"][index]
+        return url
+
+    def set_download_urls(self, filenames_to_urls: Dict[str, str]) -> None:
+        """Use the given download URLs (by filename) for the files, from now on."""
+        self._url_map = filenames_to_urls
+        names = self._dense["name"]
+        download_urls = self._sparse["download_url"]
+        for index in [i for i in list(download_urls) if names[i] in filenames_to_urls]:
+            download_urls.pop(index, None)
+
+    def get_pending_downloads(
+        self, indices: Sequence[int]
+    ) -> Dict[int, "Future[None]"]:
+        """Get the background downloads of the files at `indices`, by index."""
+        pending_downloads: Dict[int, Future[None]] = self._sparse["pending_download"]
+        if not pending_downloads:
+            return {}
+        wanted = indices if isinstance(indices, range) else set(indices)
+        return {i: f for i, f in list(pending_downloads.items()) if i in wanted}
+
+    def _get(self, index: int, attribute: str) -> Any:
+        if attribute == "size":
+            return self._sizes[index] or None
+        if attribute == "download_url":
+            return self.get_download_url(index)
+        if attribute in self._dense:
+            return self._dense[attribute][index]
+        return self._sparse[attribute].get(index)
+
+    def _set(self, index: int, attribute: str, value: Any) -> None:
+        if attribute == "size":
+            self._sizes[index] = int(value) if value else 0
+        elif attribute in self._dense:
+            self._dense[attribute][index] = value
+        elif value is None:
+            self._sparse[attribute].pop(index, None)
+        else:
+            self._sparse[attribute][index] = value
+
+
+class _Column:
+    """An attribute of a `_FileInfoView`, stored in a column of its `FileInfoList`."""
+
+    def __set_name__(self, owner: Any, name: str) -> None:
+        self.attribute = name
+
+    def __get__(self, view: Any, owner: Any = None) -> Any:
+        if view is None:
+            return self
+        return view._files._get(view._index, self.attribute)
+
+    def __set__(self, view: Any, value: Any) -> None:
+        view._files._set(view._index, self.attribute, value)
+
+
+class _FileInfoView(FileInfo):
+    """A file of a `FileInfoList`. All its state is in the list, so views can come and go."""
+
+    __slots__ = ("_files", "_index")
+
+    name = _Column()
+    uri = _Column()
+    download_url = _Column()
+    path = _Column()
+    size = _Column()
+    datum_id = _Column()
+    mirrors = _Column()
+    pending_download = _Column()
+    _checksums = _Column()
+    _metadata = _Column()
+
+    def __init__(self, files: FileInfoList, index: int) -> None:
+        self._files = files
+        self._index = index
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, _FileInfoView):
+            return NotImplemented
+        return self._files is other._files and self._index == other._index
+
+    def __hash__(self) -> int:
+        return hash((id(self._files), self._index))
+
 
 class InputInfo:
     def __init__(self, files: Iterable[FileInfo], input_id: Optional[str] = None):
-        self.files = list(files)
+        self.files = (
+            files if isinstance(files, FileInfoList) else FileInfoList.from_files(files)
+        )
         self.input_id = input_id
+        # Whether prepare_download() has resolved the download URLs already; until then,
+        # they are requested along with those of other inputs (see get_download_urls)
+        self.download_prepared = False
+        self._refresh_lock = threading.Lock()
 
     def is_downloaded(self) -> bool:
         if not self.files:
             return False
 
-        return all(f.is_downloaded() for f in self.files)
+        scan = DirectoryScan()
+        return all(self.files.is_downloaded(i, scan) for i in range(len(self.files)))
+
+    def needs_download(
+        self,
+        download: DownloadType = DownloadType.OPTIONAL,
+        files: Optional[Sequence[FileInfo]] = None,
+        scan: Optional[DirectoryScan] = None,
+        extract: bool = False,
+    ) -> bool:
+        if download in (DownloadType.ALWAYS, DownloadType.REVALIDATE):
+            return True
+        if download != DownloadType.OPTIONAL:
+            return False
+        if scan is None:
+            scan = DirectoryScan()
+        if files is None:
+            return not self.files or any(
+                not self.files.is_available(i, scan, extract)
+                for i in range(len(self.files))
+            )
+        return not (files and all(f.is_available(scan, extract) for f in files))
+
+    def get_files(
+        self, path_filter: Optional[str] = None, process_archives: bool = True
+    ) -> Sequence[FileInfo]:
+        """Get the files of this input that may match `path_filter`.
+
+        Archives that will be unpacked are always included, since their contents may match.
+        """
+        if not path_filter:
+            return self.files
+        return [self.files[i] for i in self._get_indices(path_filter, process_archives)]
+
+    def _get_indices(
+        self, path_filter: Optional[str], process_archives: bool
+    ) -> Sequence[int]:
+        """Like get_files(), but get the indices of the files in `self.files`."""
+        if not path_filter:
+            return range(len(self.files))
+        pattern = compile_path_filter(path_filter)
+        return [
+            i
+            for i, name in enumerate(self.files.names)
+            if re.match(pattern, name) or (process_archives and is_archive_name(name))
+        ]
+
+    def _get_indices_to_download(
+        self,
+        indices: Sequence[int],
+        download: DownloadType,
+        scan: DirectoryScan,
+        extract: bool,
+    ) -> Sequence[int]:
+        """Get those of the files at `indices` that are to be downloaded."""
+        if download == DownloadType.NEVER:
+            return []
+        if download == DownloadType.OPTIONAL:
+            return [i for i in indices if not self.files.is_available(i, scan, extract)]
+        return indices
 
     def download_if_necessary(
-        self, name: str, download: DownloadType = DownloadType.OPTIONAL
+        self,
+        name: str,
+        download: DownloadType = DownloadType.OPTIONAL,
+        path_filter: Optional[str] = None,
+        process_archives: bool = True,
     ) -> None:
-        if (
-            download == DownloadType.ALWAYS
-            or not self.is_downloaded()
-            and download == DownloadType.OPTIONAL
-        ):
-            path = get_inputs_path(name)
-            os.makedirs(path, exist_ok=True)
-            if self.input_id:
-                # Resolve download URLs from Valohai before downloading
-                filenames_to_urls = request_download_urls(self.input_id)
-                for file in self.files:
-                    if not file.is_downloaded():
-                        file.download_url = filenames_to_urls[file.name]
-            for f in self.files:
-                f.download(path, force_download=(download == DownloadType.ALWAYS))
+        """Download the files of this input, or only those that may match `path_filter`."""
+        # One listing of the input directories answers all the "is it on disk?" questions below
+        scan = DirectoryScan()
+        # Archives that are going to be unpacked anyway can be unpacked as they download
+        extract = process_archives
+        indices = self._get_indices_to_download(
+            self._get_indices(path_filter, process_archives), download, scan, extract
+        )
+        if indices:
+            started_at = time.time()
+            path = self.prepare_download(name, download, scan)
+            try:
+                map_concurrently(
+                    lambda i: self.download_file(
+                        self.files[i], path, download, extract
+                    ),
+                    indices,
+                )
+            finally:
+                evict_if_necessary()
+                _log_download_stats(name, path, started_at)
+
+    async def adownload_if_necessary(
+        self,
+        name: str,
+        download: DownloadType = DownloadType.OPTIONAL,
+        concurrency: Optional[int] = None,
+        path_filter: Optional[str] = None,
+        process_archives: bool = True,
+    ) -> None:
+        """Asynchronous counterpart of download_if_necessary().
+
+        Files are downloaded in worker threads, at most `concurrency` (by default,
+        the download concurrency) at a time, so the event loop is never blocked.
+        As with download_if_necessary(), the first failure in file order is raised.
+        """
+        indices = self._get_indices(path_filter, process_archives)
+        pending_downloads = self.files.get_pending_downloads(indices)
+        if pending_downloads:
+            # Let any background downloads settle; failed ones are retried below
+            await asyncio.gather(
+                *(asyncio.wrap_future(f) for f in pending_downloads.values()),
+                return_exceptions=True,
+            )
+            for i in pending_downloads:
+                self.files[i].pending_download = None
+        extract = process_archives
+        indices = await asyncio.to_thread(
+            self._get_indices_to_download, indices, download, DirectoryScan(), extract
+        )
+        if not indices:
+            return
+
+        started_at = time.time()
+        path = await asyncio.to_thread(self.prepare_download, name, download)
+        semaphore = asyncio.Semaphore(concurrency or get_download_concurrency())
+
+        async def download_file(f: FileInfo) -> None:
+            async with semaphore:
+                await asyncio.to_thread(self.download_file, f, path, download, extract)
+
+        results = await asyncio.gather(
+            *(download_file(self.files[i]) for i in indices), return_exceptions=True
+        )
+        await asyncio.to_thread(evict_if_necessary)
+        _log_download_stats(name, path, started_at)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def download_file(
+        self,
+        file: FileInfo,
+        path: str,
+        download: DownloadType = DownloadType.OPTIONAL,
+        extract: bool = False,
+    ) -> None:
+        """Download a file of this input into the directory `path`.
+
+        With `extract`, archives may be unpacked as they are downloaded (see `FileInfo.download`).
+        """
+        refresh_url = (
+            functools.partial(self.refresh_download_url, file)
+            if self.input_id
+            else None
+        )
+        file.download(
+            path,
+            force_download=download == DownloadType.ALWAYS,
+            refresh_url=refresh_url,
+            revalidate=download == DownloadType.REVALIDATE,
+            extract=extract,
+        )
+
+    def refresh_download_url(self, file: FileInfo, expired_url: str) -> str:
+        """Get a fresh download URL for `file`, whose `expired_url` has been refused."""
+        assert self.input_id
+        with self._refresh_lock:
+            # Unless another download has refreshed the URLs in the meantime
+            if file.download_url == expired_url:
+                invalidate_download_urls(self.input_id)
+                self.files.set_download_urls(get_download_urls(self.input_id))
+        assert file.download_url
+        return file.download_url
+
+    def prepare_download(
+        self,
+        name: str,
+        download: DownloadType = DownloadType.OPTIONAL,
+        scan: Optional[DirectoryScan] = None,
+    ) -> str:
+        """Get the directory to download the files of this input into, ready for downloading."""
+        path = get_inputs_path(name)
+        os.makedirs(path, exist_ok=True)
+        if scan is None:
+            scan = DirectoryScan()
+        if self.input_id:
+            # Resolve download URLs from Valohai before downloading
+            self.files.set_download_urls(get_download_urls(self.input_id))
+        datum_ids = []
+        for i in range(len(self.files)):
+            url = self.files.get_download_url(i)
+            if (
+                url
+                and url.startswith("datum://")
+                and not self.files.is_downloaded(i, scan)
+            ):
+                datum_ids.append(uri_to_filename(url))
+        if len(datum_ids) > 1:
+            # Resolve all the datums concurrently and at once, failing early if any is missing
+            resolve_datums(datum_ids)
+        self.download_prepared = True
+        return path
+
+    def iter_downloaded_files(
+        self,
+        name: str,
+        download: DownloadType = DownloadType.OPTIONAL,
+        path_filter: Optional[str] = None,
+        process_archives: bool = True,
+    ) -> Iterator[FileInfo]:
+        """Yield the files of this input that may match `path_filter`, downloading them if necessary.
+
+        Files being prefetched in the background are yielded as soon as each of them
+        is ready, instead of waiting for the whole input. Those not being prefetched
+        (any more) that aren't on disk, e.g. as their prefetch failed, are downloaded
+        in the foreground as they come.
+        """
+        indices = self._get_indices(path_filter, process_archives)
+        pending_downloads = self.files.get_pending_downloads(indices)
+        if pending_downloads and download == DownloadType.OPTIONAL:
+            path: Optional[str] = None
+            for i in indices:
+                f = self.files[i]
+                f.wait_for_pending_download()
+                if not f.is_available(extract=process_archives):
+                    if path is None:
+                        path = self.prepare_download(name, download)
+                    self.download_file(f, path, download, process_archives)
+                yield f
+            evict_if_necessary()  # what was prefetched has been stored by now
+            return
+        for i in pending_downloads:
+            with contextlib.suppress(Exception):
+                self.files[i].wait_for_pending_download()
+        self.download_if_necessary(name, download, path_filter, process_archives)
+        for i in indices:
+            yield self.files[i]
 
     @classmethod
     def from_json_data(cls, json_data: Dict[str, Any]) -> "InputInfo":
         return cls(
             input_id=json_data.get("input_id"),
-            files=[FileInfo.from_json_data(d) for d in json_data.get("files", ())],
+            files=FileInfoList.from_json_data(json_data.get("files", ())),
         )
 
     @classmethod
@@ -100,6 +699,8 @@ class InputInfo:
             # TODO: this cast shouldn't be required,
             #       but listify()'s types are wonky with new mypy
             value = str(value)
+            if is_file_uri(value):  # Used in place, like local paths
+                value = file_uri_to_path(value)
             if "://" not in value:  # The string is a local path
                 for path in glob.glob(value):
                     files.append(
@@ -123,3 +724,16 @@ class InputInfo:
                 )
 
         return cls(files=files)
+
+
+def _log_download_stats(name: str, path: str, started_at: float) -> None:
+    """Log the stats of the files of an input downloaded since `started_at`, if enabled."""
+    if not should_log_download_stats():
+        return
+    records = [
+        r
+        for r in get_download_records()
+        if r.started_at >= started_at and r.path.startswith(os.path.join(path, ""))
+    ]
+    if records:
+        log_download_stats(records, download_input=name)
@@ -1,30 +1,104 @@
-from typing import Optional
+import io
+from typing import IO, Iterator, Optional
 
 from valohai.internals import global_state, vfs
+from valohai.internals.directory_scan import DirectoryScan
 from valohai.internals.download_type import DownloadType
 from valohai.internals.global_state_loader import load_global_state_if_necessary
 from valohai.internals.input_info import InputInfo
+from valohai.internals.remote_file import RemoteFile
+from valohai.internals.utils import file_uri_to_path, is_file_uri
 
 
 def get_input_vfs(
     name: str,
     process_archives: bool = True,
     download_type: DownloadType = DownloadType.OPTIONAL,
+    decompress: bool = False,
 ) -> vfs.VFS:
     v = vfs.VFS()
+    for _ in iter_input_files(
+        v, name, process_archives, download_type, decompress=decompress
+    ):
+        pass
+    return v
+
+
+def iter_input_files(
+    v: vfs.VFS,
+    name: str,
+    process_archives: bool = True,
+    download_type: DownloadType = DownloadType.OPTIONAL,
+    path_filter: Optional[str] = None,
+    decompress: bool = False,
+) -> Iterator[vfs.File]:
+    """Add the files of an input into `v` one by one, yielding them as they are added.
+
+    Only the files that may match `path_filter` are downloaded and added; the caller
+    still needs to filter the results, e.g. for the contents of archives.
+    With `decompress`, compressed files are added as their decompressed content
+    (see `vfs.DecompressedFile`).
+
+    When the input is being prefetched, each file is yielded as soon as it has been
+    downloaded, so the caller doesn't need to wait for the whole input.
+    """
     ii = get_input_info(name)
-    if ii:
-        ii.download_if_necessary(name, download_type)
-        for file_info in ii.files:
+    if not ii:
+        return
+    for file_info in ii.iter_downloaded_files(
+        name, download_type, path_filter, process_archives
+    ):
+        assert file_info.path
+        first_new = len(v.files)
+        vfs.add_disk_file(
+            v,
+            name=file_info.name,
+            path=file_info.path,
+            process_archives=process_archives,
+            decompress=decompress,
+        )
+        yield from v.files[first_new:]
+
+
+def iter_lazy_streams(
+    name: str, path_filter: Optional[str] = None, process_archives: bool = False
+) -> Iterator[IO[bytes]]:
+    """Yield a stream for each file of an input without downloading the files.
+
+    Files already on disk are opened as is; the others are read on demand
+    with HTTP range requests (see RemoteFile). Archives can't be unpacked this way,
+    so with `process_archives`, an input that has any raises ValueError.
+    """
+    ii = get_input_info(name)
+    if not ii:
+        return
+    files = ii.get_files(path_filter, process_archives)
+    if process_archives and any(vfs.is_archive_name(f.name) for f in files):
+        raise ValueError(
+            f"Can not read the archives of {name} lazily; pass process_archives=False to read them as is"
+        )
+    scan = DirectoryScan()
+    if ii.input_id and not all(f.is_downloaded(scan) for f in files):
+        ii.prepare_download(name, scan=scan)  # resolves the download URLs
+    for file_info in files:
+        if file_info.is_downloaded(scan):
             assert file_info.path
-            vfs.add_disk_file(
-                v,
-                name=file_info.name,
-                path=file_info.path,
-                process_archives=process_archives,
+            yield open(file_info.path, "rb")  # noqa: SIM115
+        elif file_info.download_url:
+            if file_info.download_url.startswith("datum://"):
+                raise ValueError(
+                    f"Can not read {file_info.name} lazily: datum URIs must be downloaded"
+                )
+            if is_file_uri(file_info.download_url):
+                yield open(file_uri_to_path(file_info.download_url), "rb")  # noqa: SIM115
+                continue
+            yield io.BufferedReader(
+                RemoteFile(
+                    file_info.download_url, name=file_info.name, size=file_info.size
+                )
             )
-
-    return v
+        else:
+            raise ValueError(f"Can not read {file_info.name}: no path or URI")
 
 
 def get_input_info(name: str) -> Optional[InputInfo]:
@@ -0,0 +1,104 @@
+"""Background downloading of inputs, started by `valohai.prepare(prefetch_inputs=True)`."""
+
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from valohai.internals.concurrency import get_download_concurrency
+from valohai.internals.directory_scan import DirectoryScan
+
+if TYPE_CHECKING:
+    from valohai.internals.input_info import FileInfo, InputInfo
+
+_Job = Tuple["Future[None]", Callable[[], None]]
+
+
+class Prefetcher:
+    """A pool of daemon threads running download jobs.
+
+    Daemon threads don't keep the process alive when the user code is done, so any
+    downloads still in progress are simply abandoned (and resumed on the next run).
+    """
+
+    def __init__(self, workers: int) -> None:
+        self._queue: "queue.Queue[_Job]" = queue.Queue()
+        for i in range(workers):
+            threading.Thread(
+                target=self._work, name=f"valohai-prefetch-{i}", daemon=True
+            ).start()
+
+    def submit(self, func: Callable[[], None]) -> "Future[None]":
+        future: "Future[None]" = Future()
+        self._queue.put((future, func))
+        return future
+
+    def _work(self) -> None:
+        while True:
+            future, func = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                func()
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(None)
+
+
+_prefetcher: Optional[Prefetcher] = None
+
+# Whether to unpack archives as they are prefetched (when `VH_EXTRACT_ON_DOWNLOAD` allows),
+# like `InputInfo.iter_downloaded_files()` does with the default `process_archives=True`
+PREFETCH_EXTRACT = True
+
+
+def start_prefetch(inputs: Dict[str, "InputInfo"]) -> None:
+    """Start downloading all the files of the given inputs in the background.
+
+    Each file that is not yet downloaded gets a `pending_download` future,
+    which `InputInfo.iter_downloaded_files()` waits for. Files are prefetched the way
+    they are read by default, i.e. archives may be unpacked as they are downloaded
+    (see `PREFETCH_EXTRACT`).
+    """
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher(workers=get_download_concurrency())
+    for name, input_info in inputs.items():
+        prepare = _once(functools.partial(input_info.prepare_download, name))
+        scan = DirectoryScan()
+        for index in range(len(input_info.files)):
+            if input_info.files.is_available(index, scan, extract=PREFETCH_EXTRACT):
+                continue
+            file_info = input_info.files[index]
+            if not (file_info.uri or input_info.input_id):
+                continue
+            file_info.pending_download = _prefetcher.submit(
+                functools.partial(_download_file, input_info, file_info, prepare)
+            )
+
+
+def _download_file(
+    input_info: "InputInfo", file_info: "FileInfo", prepare: Callable[[], str]
+) -> None:
+    input_info.download_file(file_info, prepare(), extract=PREFETCH_EXTRACT)
+
+
+def _once(func: Callable[[], str]) -> Callable[[], str]:
+    """Wrap `func` so that it is only called once, even from many threads."""
+    lock = threading.Lock()
+    outcome: List[Future[str]] = []
+
+    def wrapper() -> str:
+        with lock:
+            if not outcome:
+                future: "Future[str]" = Future()
+                try:
+                    future.set_result(func())
+                except Exception as exc:
+                    future.set_exception(exc)
+                outcome.append(future)
+        return outcome[0].result()
+
+    return wrapper
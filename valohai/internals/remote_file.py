@@ -0,0 +1,123 @@
+import io
+import os
+from collections import OrderedDict
+from typing import Any, Optional
+
+from valohai.internals.http_client import get_http_session
+
+DEFAULT_BLOCK_SIZE = 1048576
+DEFAULT_MAX_BLOCKS = 64
+
+
+class RemoteFile(io.RawIOBase):
+    """A read-only, seekable file object reading a remote file with HTTP range requests.
+
+    The file is read in blocks of `block_size` bytes, and the `max_blocks` most recently
+    used blocks are kept in memory, so reading e.g. the footer of a Parquet file or the
+    central directory of a zip file only transfers the blocks actually touched.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        name: str = "",
+        size: Optional[int] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_blocks: int = DEFAULT_MAX_BLOCKS,
+    ) -> None:
+        super().__init__()
+        self.url = url
+        self.name = name or url
+        self.block_size = block_size
+        self.max_blocks = max(1, max_blocks)
+        self._size = size
+        self._etag: Optional[str] = None
+        self._position = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__}: {self.name}>"
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            self._get_block(0)
+        assert self._size is not None
+        return self._size
+
+    def readinto(self, buffer: Any) -> int:
+        view = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(view) and self._position < self.size:
+            index, block_offset = divmod(self._position, self.block_size)
+            block = self._get_block(index)
+            chunk = block[block_offset : block_offset + len(view) - written]
+            if not chunk:
+                break
+            view[written : written + len(chunk)] = chunk
+            written += len(chunk)
+            self._position += len(chunk)
+        return written
+
+    def _get_block(self, index: int) -> bytes:
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+        block = self._fetch_block(index)
+        self._blocks[index] = block
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def _fetch_block(self, index: int) -> bytes:
+        start = index * self.block_size
+        end = start + self.block_size - 1
+        if self._size is not None:
+            if start >= self._size:
+                return b""
+            end = min(end, self._size - 1)
+        with get_http_session().get(
+            self.url, headers={"Range": f"bytes={start}-{end}"}
+        ) as r:
+            if r.status_code == 416:  # past the end of an empty file
+                self._size = 0
+                return b""
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise OSError(
+                    f"Can not read {self.name} lazily: the server does not support range requests"
+                )
+            etag = r.headers.get("etag")
+            if self._etag is None:
+                self._etag = etag
+            elif etag != self._etag:
+                raise OSError(f"{self.name} changed while it was being read")
+            _, _, total = r.headers.get("content-range", "").rpartition("/")
+            if total.isdigit():
+                self._size = int(total)
+            return r.content
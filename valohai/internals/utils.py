@@ -1,3 +1,7 @@
+import os
+from urllib.parse import unquote, urlparse
+
+
 def uri_to_filename(uri: str) -> str:
     return uri.rpartition("/")[-1].split("?", 1)[0]
 
@@ -6,17 +10,40 @@ def string_to_bool(value: str) -> bool:
     return value.lower() != "false"
 
 
-def get_sha256_hash(filepath: str) -> str:
+def get_int_from_env(name: str, default: int) -> int:
+    """Get a positive integer from the environment, falling back to `default` if unset or invalid."""
     try:
-        from valohai_cli.utils.hashing import get_fp_sha256  # type: ignore
-    except ImportError as ie:
-        raise RuntimeError(
-            "The `valohai-cli` module must be available for verifying hash"
-        ) from ie
+        return max(1, int(os.environ[name]))
+    except (KeyError, ValueError):
+        return default
 
-    with open(filepath, "rb") as f:
-        return get_fp_sha256(f)  # type: ignore
+
+def get_float_from_env(name: str, default: float) -> float:
+    """Get a positive number from the environment, falling back to `default` if unset or invalid."""
+    try:
+        value = float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def get_sha256_hash(filepath: str) -> str:
+    from valohai.internals.checksums import hash_file
+
+    return hash_file(filepath, "sha256")
 
 
 def is_local_file_path(path_str: str) -> bool:
     return "://" not in path_str
+
+
+def is_file_uri(uri: str) -> bool:
+    return uri.startswith("file://")
+
+
+def file_uri_to_path(uri: str) -> str:
+    """Get the local path a `file://` URI points at."""
+    parsed = urlparse(uri)
+    if parsed.netloc not in ("", "localhost"):
+        raise ValueError(f"Can not use {uri}: not a file on this host")
+    return unquote(parsed.path)
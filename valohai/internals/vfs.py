@@ -1,16 +1,34 @@
+import bz2
+import gzip
 import hashlib
+import lzma
 import os
 import re
 import shutil
 import tempfile
 from contextlib import ExitStack
 from tarfile import TarFile, TarInfo
-from typing import IO, TYPE_CHECKING, List, Optional, Union
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+    cast,
+)
 from zipfile import ZipFile, ZipInfo
 
+from valohai.internals.download_locks import STATE_DIR_NAME
+
 if TYPE_CHECKING:
     DirEntry = os.DirEntry[str]
 
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tar.bz2", ".tar.xz")
+ARCHIVE_EXTENSIONS = (".zip", *TAR_EXTENSIONS)
+COMPRESSION_EXTENSIONS = (".gz", ".bz2", ".xz", ".zst")
+
 
 class File:
     parent_file: Optional["File"] = None
@@ -160,6 +178,77 @@ class FileInTar(FileInContainer):
         return self.tarinfo.path
 
 
+class DecompressedFile(FileInContainer):
+    """The decompressed content of a compressed file (other than a tarball), e.g. `data.jsonl.gz`.
+
+    It is decompressed as it is read, so only a buffer's worth is in memory at a time.
+    """
+
+    def __init__(self, parent_file: FileOnDisk) -> None:
+        self.parent_file = parent_file
+
+    def open(self) -> IO[bytes]:
+        return open_decompressed(self.parent_file.path)
+
+    def open_concrete(self, delete: bool = True) -> IO[bytes]:
+        """Like `FileInContainer.open_concrete()`, but reusing a decompressed copy made earlier.
+
+        The copy is reused as long as the compressed file hasn't been modified since.
+        """
+        file_path = os.path.join(
+            self.parent_file.container_temp_root, self.path_in_container
+        )
+        source_mtime = os.stat(self.parent_file.path).st_mtime_ns
+        if not _has_mtime(file_path, source_mtime):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            self.extract(tmp_path)
+            os.utime(tmp_path, ns=(source_mtime, source_mtime))
+            os.replace(tmp_path, file_path)
+        self._concrete_path = file_path
+        f = open(file_path, "rb")  # noqa: SIM115
+        return tempfile._TemporaryFileWrapper(f, file_path, delete=delete)
+
+    @property
+    def name(self) -> str:
+        return os.path.splitext(self.parent_file.name)[0]
+
+    @property
+    def path_in_container(self) -> str:
+        return os.path.basename(self.name)
+
+
+def open_decompressed(path: str) -> IO[bytes]:
+    """Open a compressed file for reading its decompressed content as a stream."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".gz":
+        return cast(IO[bytes], gzip.open(path, "rb"))
+    if extension == ".bz2":
+        return cast(IO[bytes], bz2.open(path, "rb"))
+    if extension == ".xz":
+        return cast(IO[bytes], lzma.open(path, "rb"))
+    if extension == ".zst":
+        try:
+            import zstandard  # type: ignore
+        except ImportError as ie:
+            raise RuntimeError(
+                f"The `zstandard` module must be available for decompressing {path}"
+            ) from ie
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"),  # noqa: SIM115
+            read_across_frames=True,
+        )
+        return cast(IO[bytes], reader)
+    raise ValueError(f"Can not decompress {path}: unknown compression")
+
+
+def _has_mtime(path: str, mtime_ns: int) -> bool:
+    try:
+        return os.stat(path).st_mtime_ns == mtime_ns
+    except FileNotFoundError:
+        return False
+
+
 def find_files_in_zip(vr: "VFS", df: FileOnDisk) -> None:
     zf = ZipFile(df.path)
     df.zipfile = zf  # type: ignore
@@ -200,10 +289,36 @@ class VFS:
         self.exit_stack.__exit__(*exc_details)
 
     def filter(self, path: str) -> List[File]:
-        pattern = re.compile(
-            path.replace("**", "*").replace("*", ".*")
-        )  # support for both * and ** notation
-        return [f for f in self.files if re.match(pattern, f.name)]
+        return list(filter_files(self.files, path))
+
+
+def filter_files(files: Iterable[File], path: str) -> Iterator[File]:
+    """Filter the files by their name; decompressed files also match by the compressed name."""
+    pattern = compile_path_filter(path)
+    return (
+        f
+        for f in files
+        if re.match(pattern, f.name)
+        or (isinstance(f, DecompressedFile) and re.match(pattern, f.parent_file.name))
+    )
+
+
+def compile_path_filter(path: str) -> "re.Pattern[str]":
+    return re.compile(
+        path.replace("**", "*").replace("*", ".*")
+    )  # support for both * and ** notation
+
+
+def is_archive_name(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_tar_name(name: str) -> bool:
+    return name.lower().endswith(TAR_EXTENSIONS)
+
+
+def is_compressed_name(name: str) -> bool:
+    return name.lower().endswith(COMPRESSION_EXTENSIONS) and not is_tar_name(name)
 
 
 def add_disk_file(
@@ -212,6 +327,7 @@ def add_disk_file(
     path: str,
     dir_entry: Optional["DirEntry"] = None,
     process_archives: bool = False,
+    decompress: bool = False,
 ) -> None:
     disk_file = FileOnDisk(name=name, path=path, dir_entry=dir_entry)
     if process_archives:
@@ -219,18 +335,46 @@ def add_disk_file(
         if extension == ".zip":
             find_files_in_zip(vfs, disk_file)
             return
-        if extension in (".tar", ".tar.gz", ".tar.bz2", ".tar.xz"):
+        if is_tar_name(name) and not (dir_entry or os.path.isfile(path)):
+            add_extracted_files(vfs, disk_file)
+            return
+        if extension in TAR_EXTENSIONS:
             find_files_in_tar(vfs, disk_file)
             return
+    if decompress and is_compressed_name(name):
+        vfs.files.append(DecompressedFile(parent_file=disk_file))
+        return
     vfs.files.append(disk_file)
 
 
-def find_files(vfs: VFS, root: str, *, process_archives: bool) -> None:
+def add_extracted_files(vfs: VFS, df: FileOnDisk) -> None:
+    """Add the members of an archive that was extracted as it was downloaded.
+
+    They are named the same as the members of the archive would be (see `FileInTar`).
+    """
+    from valohai.internals.extraction import get_extraction_dir, read_manifest
+
+    members = read_manifest(df.path)
+    if members is None:
+        raise FileNotFoundError(f"{df.path} has not been downloaded or extracted")
+    vfs.files.extend(
+        FileOnDisk(
+            name=os.path.join(os.path.dirname(df.name), member),
+            path=os.path.join(get_extraction_dir(df.path), member),
+        )
+        for member in members
+    )
+
+
+def find_files(
+    vfs: VFS, root: str, *, process_archives: bool, decompress: bool = False
+) -> None:
     def _walk(path: str) -> None:
         dent: "DirEntry"
         for dent in os.scandir(path):
             if dent.is_dir():
-                _walk(dent.path)
+                if dent.name != STATE_DIR_NAME:
+                    _walk(dent.path)
                 continue
             if not dent.is_file():
                 continue
@@ -240,6 +384,7 @@ def find_files(vfs: VFS, root: str, *, process_archives: bool) -> None:
                 path=dent.path,
                 dir_entry=dent,
                 process_archives=process_archives,
+                decompress=decompress,
             )
 
     _walk(root)
@@ -1,7 +1,11 @@
 from typing import Optional
 
+from valohai.config import is_running_in_valohai
 from valohai.internals import global_state
+from valohai.internals.download import cleanup_partial_downloads
 from valohai.internals.global_state_loader import load_global_state
+from valohai.internals.prefetch import start_prefetch
+from valohai.paths import get_inputs_path
 from valohai.types import InputDict, ParameterDict
 
 
@@ -14,6 +18,8 @@ def prepare(
     environment: Optional[str] = None,
     multifile: bool = False,
     upload_store: Optional[str] = None,
+    download_concurrency: Optional[int] = None,
+    prefetch_inputs: bool = False,
 ) -> None:
     """Define the name of the step and its required inputs, parameters and Docker image
 
@@ -28,6 +34,9 @@ def prepare(
     :param environment: Default environment ID or slug
     :param multifile: allow step to be prepared from multiple different source files
     :param upload_store: Upload store UUID for storing execution outputs
+    :param download_concurrency: Maximum number of input files to download concurrently
+                                 (overrides the VH_DOWNLOAD_CONCURRENCY environment variable)
+    :param prefetch_inputs: Start downloading all inputs in the background right away
     """
 
     global_state.step_name = step
@@ -35,8 +44,17 @@ def prepare(
     global_state.environment = environment
     global_state.multifile = multifile
     global_state.upload_store = upload_store
+    global_state.download_concurrency = download_concurrency
 
     load_global_state(
         default_inputs_from_prepare=default_inputs,
         default_parameters_from_prepare=default_parameters,
     )
+
+    if not is_running_in_valohai():
+        # Local input directories outlive executions; clear out failed downloads
+        for name in global_state.inputs:
+            cleanup_partial_downloads(get_inputs_path(name))
+
+    if prefetch_inputs:
+        start_prefetch(global_state.inputs)
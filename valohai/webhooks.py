@@ -11,6 +11,8 @@ import time
 import os
 import re
 
+from valohai.internals.http_client import get_http_session
+
 
 class StrEnum(str, enum.Enum):
     pass
@@ -249,7 +251,7 @@ class Webhook:
         headers["Content-Type"] = content_type
         encoded_query = urllib.parse.urlencode(query)
 
-        response: requests.Response = requests.post(
+        response: requests.Response = get_http_session().post(
             f"{self.url}?{encoded_query}", data=encoded_data, headers=headers
         )
 
@@ -268,7 +270,7 @@ class Webhook:
             query_params = query
         encoded_query = urllib.parse.urlencode(query_params)
 
-        response: requests.Response = requests.post(
+        response: requests.Response = get_http_session().post(
             f"{self.url}?{encoded_query}", headers=headers
         )
 